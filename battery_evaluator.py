@@ -4,11 +4,15 @@ Specialized evaluator for classifying CR2032 battery state
 Completely independent, no Nordic driver dependencies
 """
 import logging
+from bisect import bisect_right
 from typing import Dict
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+# Distinct voltages remembered per evaluator (mV values repeat across scans)
+EVALUATION_CACHE_SIZE = 4096
+
 @dataclass
 class CR2032Thresholds:
     """Voltage thresholds for CR2032 batteries (in millivolts)"""
@@ -25,6 +29,29 @@ class CR2032BatteryEvaluator:
     
     def __init__(self, custom_thresholds: CR2032Thresholds = None):
         self.thresholds = custom_thresholds or CR2032Thresholds()
+        self._new_span = self.thresholds.NEW_MAX - self.thresholds.NEW_MIN
+        # Lower bound of each band in ascending order; bisect picks the band
+        self._band_bounds = (self.thresholds.LOW, self.thresholds.GOOD, self.thresholds.NEW_MIN)
+        self._bands = (
+            ("DEAD", "FAIL", "Dead battery - replace immediately", self._percentage_dead),
+            ("LOW", "WARN", "Low battery - monitor closely", self._percentage_low),
+            ("GOOD", "GOOD", "Good battery - continue use", self._percentage_good),
+            ("NEW", "GOOD", "New battery - continue use", self._percentage_new),
+        )
+        self._cache: Dict[int, Dict] = {}
+    
+    def _percentage_new(self, voltage_mv: int) -> float:
+        # Clamped once in evaluate_battery
+        return ((voltage_mv - self.thresholds.NEW_MIN) / self._new_span) * 100
+    
+    def _percentage_good(self, voltage_mv: int) -> float:
+        return 80 - ((self.thresholds.NEW_MIN - voltage_mv) / 10)
+    
+    def _percentage_low(self, voltage_mv: int) -> float:
+        return 20 - ((self.thresholds.GOOD - voltage_mv) / 5)
+    
+    def _percentage_dead(self, voltage_mv: int) -> float:
+        return 0
         
     def evaluate_battery(self, voltage_mv: int) -> Dict:
         """
@@ -35,31 +62,19 @@ class CR2032BatteryEvaluator:
             
         Returns:
             Dict with category, status, percentage estimate and recommendation
+            (a fresh copy; repeated voltages are served from a small cache)
         """
-        if voltage_mv >= self.thresholds.NEW_MIN:
-            category = "NEW"
-            status = "GOOD"
-            percentage = min(100, ((voltage_mv - self.thresholds.NEW_MIN) / 
-                                 (self.thresholds.NEW_MAX - self.thresholds.NEW_MIN)) * 100)
-            recommendation = "New battery - continue use"
-            
-        elif voltage_mv >= self.thresholds.GOOD:
-            category = "GOOD"
-            status = "GOOD"
-            percentage = 80 - ((self.thresholds.NEW_MIN - voltage_mv) / 10)
-            recommendation = "Good battery - continue use"
-            
-        elif voltage_mv >= self.thresholds.LOW:
-            category = "LOW"
-            status = "WARN"
-            percentage = 20 - ((self.thresholds.GOOD - voltage_mv) / 5)
-            recommendation = "Low battery - monitor closely"
-            
-        else:
-            category = "DEAD"
-            status = "FAIL"
-            percentage = 0
-            recommendation = "Dead battery - replace immediately"
+        cached = self._cache.get(voltage_mv)
+        if cached is None:
+            if len(self._cache) >= EVALUATION_CACHE_SIZE:
+                self._cache.clear()
+            cached = self._cache[voltage_mv] = self._evaluate(voltage_mv)
+        return dict(cached)
+    
+    def _evaluate(self, voltage_mv: int) -> Dict:
+        category, status, recommendation, percentage_fn = \
+            self._bands[bisect_right(self._band_bounds, voltage_mv)]
+        percentage = percentage_fn(voltage_mv)
         
         return {
             'voltage_mv': voltage_mv,
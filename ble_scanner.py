@@ -73,30 +73,39 @@ def validate_environment():
 # Run validation before any other imports
 validate_environment()
 
-from collections import deque
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from operator import itemgetter
 from time import perf_counter
-from typing import List, Dict
-from threading import Event
+from typing import List, Dict, Optional
 from pathlib import Path
-from pc_ble_driver_py.ble_driver import BLEDriver, BLEEnableParams, BLEGapScanParams
+from pc_ble_driver_py.ble_driver import BLEDriver, BLEGapScanParams, BLEAdvData
 from pc_ble_driver_py.observers import BLEDriverObserver
 from datetime import datetime, timezone as dt_timezone, timedelta
-from pytz import timezone as pytz_timezone, utc
 # Optional colorama: define init() regardless of availability
 try:
     from colorama import init as _colorama_init
 except Exception:
     def _colorama_init():
         pass
-# Provide a global init symbol used later in the code
+# Provide a global init symbol used later in the code (called once in main)
 init = _colorama_init
-init()
+# Optional orjson/msgspec: faster result JSON serialization (stdlib json otherwise)
+try:
+    import orjson
+except Exception:
+    orjson = None
+try:
+    import msgspec
+except Exception:
+    msgspec = None
 
 from config import config
+from battery_evaluator import CR2032BatteryEvaluator
 from utils.ports import get_com_port
-from utils.telemetry import send_batch_summary, send_batch_csv_details, post_manuf_event, load_env
-# Add CSV detail sender
-from utils.telemetry import send_batch_csv_details
+from utils.advertising import format_mac_address, mac_to_address, normalize_mac_address, parse_battery_voltage
+from utils.telemetry import send_batch_summary, send_batch_csv_details, enqueue_manuf_event, flush_manuf_events, load_env
 import uuid
 
 # Simplified configuration
@@ -113,39 +122,66 @@ battery_flag = False
 API_ENDPOINT = "http://vmprdate.eastus.cloudapp.azure.com:9000/api/v1/manifest"
 QRMAC_ENDPOINT = API_ENDPOINT
 
-
-def ManufEvent(qr_or_mac, failure_code, details):
-    """Post per-device manufacturing event using form-encoded API.
+# Advertising records looked up directly (no per-record walk)
+MFG_DATA_TYPE = BLEAdvData.Types.manufacturer_specific_data
+COMPLETE_NAME_TYPE = BLEAdvData.Types.complete_local_name
+SHORT_NAME_TYPE = BLEAdvData.Types.short_local_name
+
+# Fixed CSV schemas (every result record carries these keys; no per-save key scan).
+# utils.telemetry.send_batch_csv_details reads qr_or_mac (col 0) and pass_fail (col 6).
+RESULT_CSV_FIELDS = ('qr_or_mac', 'voltage_v', 'voltage_mv', 'category', 'status',
+                     'percentage_estimate', 'pass_fail', 'rssi', 'comment', 'timestamp')
+DOUBLE_RESULT_CSV_FIELDS = (
+    'macid', 'qr',
+    'pre_voltage_mv', 'pre_status', 'pre_rssi', 'pre_timestamp',
+    'post_voltage_mv', 'post_status', 'post_rssi', 'post_timestamp',
+    'delta_voltage_mv', 'final_status'
+)
+RESULT_CSV_HEADER = ','.join(RESULT_CSV_FIELDS)
+RESULT_ROW_GETTER = itemgetter(*RESULT_CSV_FIELDS)
+# Column order after qr_or_mac, fixed once (the partial-record path reuses it)
+RESULT_CSV_TAIL_FIELDS = RESULT_CSV_FIELDS[1:]
+
+# Shared evaluator: its evaluation cache survives across observers, so the
+# post-test pass and later devices reuse results for voltages already seen
+BATTERY_EVALUATOR = CR2032BatteryEvaluator()
+
+# UTC timestamp format stored in result records
+RESULT_TIMESTAMP_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# Result comment template (%-formatting; same text as str() of each value)
+RESULT_COMMENT_FMT = "RSSI %s | Battery %sV"
+
+
+def ManufEvent(qr_or_mac, failure_code, details, event_time=None):
+    """Queue a per-device manufacturing event (form-encoded API, posted in the background).
     - qr_or_mac: QR code (preferred). If None, MAC may be used (API may require QR).
     - failure_code: 'ALL-PASS-000' or 'ALL-FAIL-000' (per-device reflects real result).
     - details: dict with device fields to compose CSV row, or plain string for notes.
+    - event_time: UTC datetime already taken for the result (default: now).
     """
     try:
         env = load_env()
-        now = datetime.now(dt_timezone.utc)
+        now = event_time or datetime.now(dt_timezone.utc)
         # Build notes: CSV header + one line, or raw string
         if isinstance(details, dict):
-            header = 'qr_or_mac,voltage_v,voltage_mv,category,status,percentage_estimate,pass_fail,rssi,comment,timestamp'
-            row = [
-                str(details.get('qr_or_mac', qr_or_mac) or ''),
-                str(details.get('voltage_v', '')),
-                str(details.get('voltage_mv', '')),
-                str(details.get('category', '')),
-                str(details.get('status', '')),
-                str(details.get('percentage_estimate', '')),
-                str(details.get('pass_fail', '')),
-                str(details.get('rssi', '')),
-                str(details.get('comment', '')),
-                str(details.get('timestamp', '')),
-            ]
-            csv_line = ",".join(row)
+            header = RESULT_CSV_HEADER
+            try:
+                # Complete records: every column in one C-level tuple fetch
+                values = RESULT_ROW_GETTER(details)
+            except KeyError:
+                # Partial records (e.g. no timestamp): '' for missing columns
+                values = (details.get('qr_or_mac', qr_or_mac),) + tuple(map(details.get, RESULT_CSV_TAIL_FIELDS, repeat('')))
+            csv_line = ",".join([str(values[0] or '')] + list(map(str, values[1:])))
             notes = f"{header}\n{csv_line}"
             # Guard size
             if len(notes) > 7900:
                 notes = notes[:7900] + "\n... (truncated)"
         else:
             notes = str(details)
-        status = post_manuf_event(
+        # Posted on the telemetry thread: scan callbacks do not wait for the API
+        enqueue_manuf_event(
+            callback=_report_manuf_status,
             curr_qr=str(qr_or_mac or ''),
             failure_code=failure_code,
             start_time=now,
@@ -155,14 +191,18 @@ def ManufEvent(qr_or_mac, failure_code, details):
             operator_id=env['operator_id'],
             api_url=env['api_url']
         )
-        if status and 200 <= status < 300:
-            print("Per-device event posted")
-        else:
-            print(f"Per-device event failed (HTTP {status})")
     except Exception as e:
         print(f"Error posting per-device event: {e}")
 
 
+def _report_manuf_status(status):
+    """Print the outcome of a queued per-device event."""
+    if status and 200 <= status < 300:
+        print("Per-device event posted")
+    else:
+        print(f"Per-device event failed (HTTP {status})")
+
+
 def databaseUpdate(qrCode, new_comment):
     """Append new comment without overwriting existing database comment."""
     try:
@@ -199,59 +239,35 @@ class UniversalBLEScanObserver(BLEDriverObserver):
         self.ble_driver = ble_driver
         self.formatted_mac = formatted_mac
         self.qrcode = qrcode
+        # Target address precomputed once; adverts are matched on raw bytes
+        self.target_addr = mac_to_address(formatted_mac)
 
     def on_gap_evt_adv_report(self, ble_driver, conn_handle, peer_addr, rssi, adv_type, adv_data):
         global raw_rssi, raw_battery, rssi_flag, battery_flag
-        mac_address = ':'.join(f'{byte:02X}' for byte in peer_addr.addr).strip()
         
-        if mac_address == self.formatted_mac:
+        if tuple(peer_addr.addr) == self.target_addr:
             #print(f"Device found: {self.formatted_mac}")
             
-            # Universal protocol - try both formats automatically
-            battery_parsed = False
+            # Universal protocol - both formats detected automatically
+            adv_payload = adv_data.records.get(MFG_DATA_TYPE)
+            battery = parse_battery_voltage(adv_payload) if adv_payload is not None else None
             
-            for data_type, adv_payload in adv_data.records.items():
-                if str(data_type) == "Types.manufacturer_specific_data":
-                    
-                    # Protocol 1: Complex format (ex Mini-Gold)
-                    if len(adv_payload) == 26 and adv_payload[-2] == 179 and adv_payload[-3] == 255:
-                        #print(f"Data received (Protocol 1): RSSI: {rssi}, MAC: {self.formatted_mac}")
-                        try:
-                            battery_int = float(adv_payload[-1])
-                            battery_dec = float(adv_payload[-4]) / 100
-                            battery = battery_int + battery_dec
-                            #print(f"Battery Voltage: {battery}V")
-                            battery_parsed = True
-                        except Exception as e:
-                            print(f"Error parsing data (Protocol 1): {e}")
-                    
-                    # Protocol 2: Simple format (ex Mini-White)  
-                    elif len(adv_payload) >= 2 and not battery_parsed:
-                        #print(f"Data received (Protocol 2): RSSI: {rssi}, MAC: {self.formatted_mac}")
-                        try:
-                            battery = float(adv_payload[-1]) / 10
-                            #print(f"Battery Voltage: {battery}V")
-                            battery_parsed = True
-                        except Exception as e:
-                            print(f"Error parsing data (Protocol 2): {e}")
+            if battery is not None:
+                #print(f"Battery Voltage: {battery}V")
+                raw_rssi = rssi
+                raw_battery = battery
+                
+                # Evaluate parameters - but don't filter out devices based on RSSI
+                rssi_flag = rssi > -55  # This is just for informational purposes
+                battery_flag = battery > BATTERY_THRESHOLD
+                
+                # Always report RSSI - removed filtering based on RSSI value
+                print(f"RSSI: {rssi} dBm ({'Good' if rssi_flag else 'Low'})")
                     
-                    if battery_parsed:
-                        raw_rssi = rssi
-                        raw_battery = battery
-                        
-                        # Evaluate parameters - but don't filter out devices based on RSSI
-                        rssi_flag = rssi > -55  # This is just for informational purposes
-                        battery_flag = battery > BATTERY_THRESHOLD
-                        
-                        # Always report RSSI - removed filtering based on RSSI value
-                        print(f"RSSI: {rssi} dBm ({'Good' if rssi_flag else 'Low'})")
-                            
-                        if not battery_flag:
-                            print(f"Low Battery: {battery}V")
-                        else:
-                            print(f"Good Battery: {battery}V")
-                        
-                        break
+                if not battery_flag:
+                    print(f"Low Battery: {battery}V")
+                else:
+                    print(f"Good Battery: {battery}V")
 
 
 class MultiTargetObserver(BLEDriverObserver):
@@ -264,63 +280,42 @@ class MultiTargetObserver(BLEDriverObserver):
         self.targets = {m.upper(): q for m, q in targets.items()}
         self.results = results
         self.pending = pending
+        self.evaluator = BATTERY_EVALUATOR
+        # Raw address -> MAC for every target, so non-target adverts skip formatting
+        self.addr_to_mac = {}
+        for mac in self.targets:
+            addr = mac_to_address(mac)
+            if addr is not None:
+                self.addr_to_mac[addr] = mac
 
     def on_gap_evt_adv_report(self, ble_driver, conn_handle, peer_addr, rssi, adv_type, adv_data):
         global raw_rssi, raw_battery, rssi_flag, battery_flag
-        mac_address = ':'.join(f'{byte:02X}' for byte in peer_addr.addr).strip()
-
-        if mac_address in self.pending:
-            # Try parsing manufacturer_specific_data records
-            battery_parsed = False
-            battery = None
-            for data_type, adv_payload in adv_data.records.items():
-                if str(data_type) == "Types.manufacturer_specific_data":
-                    # Protocol 1: Complex format
-                    try:
-                        if len(adv_payload) == 26 and adv_payload[-2] == 179 and adv_payload[-3] == 255:
-                            battery_int = float(adv_payload[-1])
-                            battery_dec = float(adv_payload[-4]) / 100
-                            battery = battery_int + battery_dec
-                            battery_parsed = True
-                            break
-                    except Exception:
-                        pass
-
-                    # Protocol 2: Simple format
-                    try:
-                        if len(adv_payload) >= 2 and not battery_parsed:
-                            battery = float(adv_payload[-1]) / 10
-                            battery_parsed = True
-                            break
-                    except Exception:
-                        pass
+        mac_address = self.addr_to_mac.get(tuple(peer_addr.addr))
+
+        if mac_address is not None and mac_address in self.pending:
+            # Parse manufacturer_specific_data record (both protocols)
+            adv_payload = adv_data.records.get(MFG_DATA_TYPE)
+            battery = parse_battery_voltage(adv_payload) if adv_payload is not None else None
 
             # Record result if parsed
-            if battery_parsed and battery is not None:
+            if battery is not None:
                 # Build result entry
                 qr = self.targets.get(mac_address)
                 voltage_v = battery
                 voltage_mv = int(voltage_v * 1000)
 
-                # Evaluate battery
-                try:
-                    from battery_evaluator import CR2032BatteryEvaluator
-                    evaluator = CR2032BatteryEvaluator()
-                    eval_res = evaluator.evaluate_battery(voltage_mv)
-                    category = eval_res['category']
-                    status = eval_res['status']
-                    percentage = eval_res['percentage_estimate']
-                    pass_fail = eval_res['pass_fail']
-                except Exception:
-                    category = 'UNKNOWN'
-                    status = 'UNKNOWN'
-                    percentage = None
-                    pass_fail = False
-
-                # Record timestamp (UTC)
-                timestamp = datetime.now(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-
-                comment = f"RSSI {rssi} | Battery {voltage_v}V"
+                # Evaluate battery (voltage already validated by the parser)
+                eval_res = self.evaluator.evaluate_battery(voltage_mv)
+                category = eval_res['category']
+                status = eval_res['status']
+                percentage = eval_res['percentage_estimate']
+                pass_fail = eval_res['pass_fail']
+
+                # Record timestamp (UTC); the same instant is reused for the event
+                seen_at = datetime.now(dt_timezone.utc)
+                timestamp = seen_at.strftime(RESULT_TIMESTAMP_FMT)
+
+                comment = RESULT_COMMENT_FMT % (rssi, voltage_v)
 
                 entry = {
                     'qr_or_mac': qr or mac_address,
@@ -343,15 +338,12 @@ class MultiTargetObserver(BLEDriverObserver):
                     failure_code = 'ALL-PASS-000' if pass_fail else 'ALL-FAIL-000'
                     if qr:
                         databaseUpdate(qr, comment)
-                        ManufEvent(qr, failure_code, entry)
+                        ManufEvent(qr, failure_code, entry, event_time=seen_at)
                 except Exception as e:
                     print(f"Error sending events for {mac_address}: {e}")
 
                 # Remove from pending set
-                try:
-                    self.pending.remove(mac_address)
-                except KeyError:
-                    pass
+                self.pending.discard(mac_address)
 
 
 # New helper: run a single multi-target scan session for a given timeout (seconds)
@@ -392,43 +384,94 @@ def run_multi_scan(targets: Dict[str, str], timeout_s: int) -> Dict[str, Dict]:
     return results, pending, elapsed
 
 
+def encode_results_json(data, compact: bool = True) -> Optional[bytes]:
+    """Encode with the serializer chosen by config.JSON_SERIALIZER ('orjson' or 'msgspec').
+    Returns None when that library is missing or cannot encode data (caller uses stdlib json).
+    """
+    serializer = config.JSON_SERIALIZER
+    try:
+        if serializer == 'orjson' and orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS  # json.dump also stringifies int keys
+            if not compact:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(data, option=option)
+        if serializer == 'msgspec' and msgspec is not None:
+            payload = msgspec.json.encode(data)
+            return payload if compact else msgspec.json.format(payload, indent=2)
+    except (TypeError, ValueError):
+        pass  # Not serializable by the fast encoder
+    return None
+
+
+def write_results_json(json_path: str, data: Dict, compact: Optional[bool] = None):
+    """Write result JSON using config.JSON_SERIALIZER (orjson/msgspec when available).
+    compact defaults to not config.JSON_PRETTY (no indentation for machine consumers).
+    """
+    if compact is None:
+        compact = not config.JSON_PRETTY
+    payload = encode_results_json(data, compact)
+    if payload is not None:
+        with open(json_path, 'wb') as jf:
+            jf.write(payload)
+        return
+    with open(json_path, 'w', encoding='utf-8') as jf:
+        if compact:
+            json.dump(data, jf, separators=(',', ':'), ensure_ascii=False)
+        else:
+            json.dump(data, jf, indent=2, ensure_ascii=False)
+
+
+def append_results_jsonl(jsonl_path: str, records: List[Dict], truncate: bool = False):
+    """Append records to a JSON Lines file, one result per line (truncate=True starts it over)."""
+    Path(jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+    if not records and not truncate:
+        return
+    lines = [encode_results_json(r) for r in records]
+    if None in lines:
+        lines = [json.dumps(r, ensure_ascii=False).encode('utf-8') for r in records]
+    with open(jsonl_path, 'wb' if truncate else 'ab') as jf:
+        if lines:
+            jf.write(b'\n'.join(lines) + b'\n')
+
+
+def write_double_results_csv(csv_path: str, results_list: List[Dict]):
+    """Write double-scan rows (pre/post columns flattened) to csv_path."""
+    with open(csv_path, 'w', newline='', encoding='utf-8', buffering=config.CSV_WRITE_BUFFER) as cf:
+        # Plain csv.writer over tuples in DOUBLE_RESULT_CSV_FIELDS order (no per-row dicts)
+        writer = csv.writer(cf)
+        writer.writerow(DOUBLE_RESULT_CSV_FIELDS)
+        for r in results_list:
+            # One lookup per nested record instead of one per column
+            pre = r.get('pre_test') or {}
+            post = r.get('post_test') or {}
+            writer.writerow((
+                r.get('macid'), r.get('qr'),
+                pre.get('voltage_mv'), pre.get('status'), pre.get('rssi'), pre.get('timestamp'),
+                post.get('voltage_mv'), post.get('status'), post.get('rssi'), post.get('timestamp'),
+                r.get('delta_voltage'), r.get('final_status')
+            ))
+
+
+def write_json_and_csv(json_path: str, json_data: Dict, csv_path: str, write_csv, rows: List[Dict],
+                       compact: Optional[bool] = None):
+    """Write the JSON and CSV outputs concurrently (formatting one while the other hits the disk).
+    Both writes always run to completion; the first error is then re-raised.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        jobs = (pool.submit(write_results_json, json_path, json_data, compact),
+                pool.submit(write_csv, csv_path, rows))
+    for job in jobs:
+        job.result()
+
+
 def save_double_results(results_list: List[Dict], json_path: str, csv_path: str, metrics: Dict):
     """Save double-scan results (pre/post) to JSON and CSV."""
     try:
         p = Path(json_path).parent
         p.mkdir(parents=True, exist_ok=True)
 
-        with open(json_path, 'w', encoding='utf-8') as jf:
-            out = {'metrics': metrics, 'results': results_list}
-            json.dump(out, jf, indent=2)
-
-        # CSV fields for pre/post
-        csv_fields = [
-            'macid', 'qr',
-            'pre_voltage_mv', 'pre_status', 'pre_rssi', 'pre_timestamp',
-            'post_voltage_mv', 'post_status', 'post_rssi', 'post_timestamp',
-            'delta_voltage_mv', 'final_status'
-        ]
-
-        with open(csv_path, 'w', newline='', encoding='utf-8') as cf:
-            writer = csv.DictWriter(cf, fieldnames=csv_fields)
-            writer.writeheader()
-            for r in results_list:
-                row = {
-                    'macid': r.get('macid'),
-                    'qr': r.get('qr'),
-                    'pre_voltage_mv': r.get('pre_test', {}).get('voltage_mv'),
-                    'pre_status': r.get('pre_test', {}).get('status'),
-                    'pre_rssi': r.get('pre_test', {}).get('rssi'),
-                    'pre_timestamp': r.get('pre_test', {}).get('timestamp'),
-                    'post_voltage_mv': r.get('post_test', {}).get('voltage_mv'),
-                    'post_status': r.get('post_test', {}).get('status'),
-                    'post_rssi': r.get('post_test', {}).get('rssi'),
-                    'post_timestamp': r.get('post_test', {}).get('timestamp'),
-                    'delta_voltage_mv': r.get('delta_voltage'),
-                    'final_status': r.get('final_status')
-                }
-                writer.writerow(row)
+        write_json_and_csv(json_path, {'metrics': metrics, 'results': results_list},
+                           csv_path, write_double_results_csv, results_list)
 
         print(f"Saved JSON results to {json_path}")
         print(f"Saved CSV results to {csv_path}")
@@ -436,17 +479,16 @@ def save_double_results(results_list: List[Dict], json_path: str, csv_path: str,
         print(f"Error saving double results: {e}")
 
 
-def perform_double_scan(mac_list: List[str], scan_time: int):
-    """Perform pre-test and post-test scans for a batch of MACs.
+def resolve_targets(mac_list: List[str]):
+    """Resolve MACs/QR codes to a {MAC: qr_or_none} dict (input order kept).
 
-    Returns a list of combined result records.
+    Returns (targets, unresolved_qr_codes).
     """
-    # Resolve all entries to MACs first
-    targets: Dict[str, str] = {}
+    targets: Dict[str, Optional[str]] = {}
     unresolved = []
     for entry in mac_list:
         if ':' in entry or len(entry) == 12:
-            targets[entry.upper()] = None
+            targets[normalize_mac_address(entry)] = None
         else:
             qrcode = entry
             try:
@@ -455,7 +497,7 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
                     data = resp.json()
                     mac_address = data.get('macAddress', '')
                     if mac_address:
-                        targets[mac_address.upper()] = qrcode
+                        targets[normalize_mac_address(mac_address)] = qrcode
                     else:
                         print(f"MAC not found for QR: {qrcode}")
                         unresolved.append(qrcode)
@@ -465,6 +507,16 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
             except Exception as e:
                 print(f"Error resolving QR {qrcode}: {e}")
                 unresolved.append(qrcode)
+    return targets, unresolved
+
+
+def perform_double_scan(mac_list: List[str], scan_time: int):
+    """Perform pre-test and post-test scans for a batch of MACs.
+
+    Returns a list of combined result records.
+    """
+    # Resolve all entries to MACs first
+    targets, unresolved = resolve_targets(mac_list)
 
     if not targets:
         print("No MACs to scan after resolving QR codes")
@@ -476,8 +528,9 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
     # Pre-test
     pre_results, pending_pre, elapsed_pre = run_multi_scan(targets, scan_time)
 
-    # Build pre-test summary and print lines
+    # Build pre-test summary and print lines (one buffered write for all units)
     pre_records = {}
+    out = []
     for mac, qr in targets.items():
         rec = pre_results.get(mac)
         if rec:
@@ -499,9 +552,11 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
         }
 
         if pre_voltage_mv is not None:
-            print(f"[PRE-TEST] {mac} -> {pre_voltage_mv} mV, {pre_status}")
+            out.append(f"[PRE-TEST] {mac} -> {pre_voltage_mv} mV, {pre_status}\n")
         else:
-            print(f"[PRE-TEST] {mac} -> No data, {pre_status}")
+            out.append(f"[PRE-TEST] {mac} -> No data, {pre_status}\n")
+    sys.stdout.write(''.join(out))
+    sys.stdout.flush()
 
     # Operator confirmation for post-test
     if config.POST_TEST_ENABLED:
@@ -514,11 +569,14 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
 
     # Combine results
     combined = []
+    out = []
     pass_count = 0
     fail_count = 0
+    delta_fail_mv = config.DELTA_VOLTAGE_FAIL
 
     for mac, qr in targets.items():
-        pre = pre_records.get(mac, {})
+        # Built once in the pre-test pass; reused as-is for the JSON/CSV record
+        pre = pre_records[mac]
         post_rec = post_results.get(mac)
         if post_rec:
             post_voltage_mv = post_rec.get('voltage_mv')
@@ -532,19 +590,20 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
             post_timestamp = None
 
         # Delta: post - pre (mV)
+        pre_voltage_mv = pre['voltage_mv']
         delta = None
-        if pre.get('voltage_mv') is not None and post_voltage_mv is not None:
-            delta = post_voltage_mv - pre.get('voltage_mv')
-        elif pre.get('voltage_mv') is None and post_voltage_mv is not None:
+        if pre_voltage_mv is not None and post_voltage_mv is not None:
+            delta = post_voltage_mv - pre_voltage_mv
+        elif pre_voltage_mv is None and post_voltage_mv is not None:
             delta = 0
-        elif pre.get('voltage_mv') is not None and post_voltage_mv is None:
-            delta = -pre.get('voltage_mv')
+        elif pre_voltage_mv is not None and post_voltage_mv is None:
+            delta = -pre_voltage_mv
 
-        # Determine final status
+        # Determine final status (a drop is a negative delta)
         final_status = 'PASS'
         if post_status != 'PASS':
             final_status = 'FAIL'
-        if delta is not None and (pre.get('voltage_mv') is not None) and (pre.get('voltage_mv') - post_voltage_mv > config.DELTA_VOLTAGE_FAIL):
+        if delta is not None and -delta > delta_fail_mv:
             final_status = 'FAIL'
 
         if final_status == 'PASS':
@@ -552,22 +611,17 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
         else:
             fail_count += 1
 
-        # Print post-test line with delta
+        # Post-test line with delta (written with the others after the loop)
         if post_voltage_mv is not None:
             delta_display = f" (Δ {delta} mV)" if delta is not None else ""
-            print(f"[POST-TEST] {mac} -> {post_voltage_mv} mV, {post_status}{delta_display}")
+            out.append(f"[POST-TEST] {mac} -> {post_voltage_mv} mV, {post_status}{delta_display}\n")
         else:
-            print(f"[POST-TEST] {mac} -> No data, {post_status}")
+            out.append(f"[POST-TEST] {mac} -> No data, {post_status}\n")
 
         combined_entry = {
             'macid': mac,
             'qr': qr,
-            'pre_test': {
-                'voltage_mv': pre.get('voltage_mv'),
-                'rssi': pre.get('rssi'),
-                'status': pre.get('status'),
-                'timestamp': pre.get('timestamp')
-            },
+            'pre_test': pre,
             'post_test': {
                 'voltage_mv': post_voltage_mv,
                 'rssi': post_rssi,
@@ -578,6 +632,8 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
             'final_status': final_status
         }
         combined.append(combined_entry)
+    sys.stdout.write(''.join(out))
+    sys.stdout.flush()
 
     # Summary
     print('\nSUMMARY:')
@@ -597,6 +653,9 @@ def perform_double_scan(mac_list: List[str], scan_time: int):
     # Save results
     save_double_results(combined, config.OUTPUT_JSON_FILE, config.OUTPUT_CSV_FILE, metrics)
 
+    # Per-device events were queued during the scans: wait for them (EVENT_FLUSH_TIMEOUT_S at most)
+    flush_manuf_events()
+
     return combined
 
 
@@ -745,6 +804,26 @@ def load_qr_codes(file_path: str) -> List[str]:
     return entries
 
 
+def write_results_csv(csv_path: str, results: List[Dict]):
+    """Write result dicts to csv_path in RESULT_CSV_FIELDS order (chunked, with progress)."""
+    with open(csv_path, 'w', newline='', encoding='utf-8', buffering=config.CSV_WRITE_BUFFER) as cf:
+        # Result dicts are written as-is: the writer picks RESULT_CSV_FIELDS in order,
+        # fills missing keys with '' and skips extras (e.g. elapsed_s)
+        writer = csv.DictWriter(cf, fieldnames=RESULT_CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+        # Process in chunks to avoid memory issues (indexed, no per-chunk list copy)
+        chunk_size = 1000
+        total = len(results)
+        for i in range(0, total, chunk_size):
+            for j in range(i, min(i + chunk_size, total)):
+                writer.writerow(results[j])
+
+            # Progress indication for large datasets
+            if total > 1000 and (i + chunk_size) % 14000 == 0:
+                print(f"Saved {min(i + chunk_size, total)}/{total} records...")
+
+
 def save_results_batch(results: List[Dict], json_path: str, csv_path: str, metrics: Dict):
     """Save aggregated results to JSON and CSV and include metrics in JSON - Optimized for large datasets."""
     try:
@@ -753,44 +832,12 @@ def save_results_batch(results: List[Dict], json_path: str, csv_path: str, metri
         p.mkdir(parents=True, exist_ok=True)
 
         print(f"Saving {len(results)} results to files...")
-        
-        # Write JSON with optimization for large files
-        with open(json_path, 'w', encoding='utf-8') as jf:
-            out = {'metrics': metrics, 'results': results}
-            # Use separators to reduce file size and disable indentation for large datasets
-            if len(results) > 1000:
-                json.dump(out, jf, separators=(',', ':'), ensure_ascii=False)
-            else:
-                json.dump(out, jf, indent=2, ensure_ascii=False)
 
-        # Write CSV with buffering for large datasets
-        csv_fields = ['qr_or_mac', 'voltage_v', 'voltage_mv', 'category', 'status', 'percentage_estimate', 'pass_fail', 'rssi', 'comment', 'timestamp']
-        with open(csv_path, 'w', newline='', encoding='utf-8', buffering=8192) as cf:  # 8KB buffer for large files
-            writer = csv.DictWriter(cf, fieldnames=csv_fields)
-            writer.writeheader()
-            
-            # Process in chunks to avoid memory issues
-            chunk_size = 1000
-            for i in range(0, len(results), chunk_size):
-                chunk = results[i:i + chunk_size]
-                for r in chunk:
-                    row = {
-                        'qr_or_mac': r.get('qr_or_mac'),
-                        'voltage_v': r.get('voltage_v'),
-                        'voltage_mv': r.get('voltage_mv'),
-                        'category': r.get('category'),
-                        'status': r.get('status'),
-                        'percentage_estimate': r.get('percentage_estimate'),
-                        'pass_fail': r.get('pass_fail'),
-                        'rssi': r.get('rssi'),
-                        'comment': r.get('comment'),
-                        'timestamp': r.get('timestamp')
-                    }
-                    writer.writerow(row)
-                
-                # Progress indication for large datasets
-                if len(results) > 1000 and (i + chunk_size) % 14000 == 0:
-                    print(f"Saved {min(i + chunk_size, len(results))}/{len(results)} records...")
+        # JSON and CSV are written in parallel threads
+        # Indent only when JSON_PRETTY is set, and never for large datasets
+        write_json_and_csv(json_path, {'metrics': metrics, 'results': results},
+                           csv_path, write_results_csv, results,
+                           compact=not config.JSON_PRETTY or len(results) > 1000)
 
         print(f"Successfully saved {len(results)} results:")
         print(f"  JSON: {json_path}")
@@ -843,9 +890,7 @@ def process_single_device(formatted_mac: str, qrcode: str) -> Dict:
 
             # Evaluate battery using battery_evaluator module
             try:
-                from battery_evaluator import CR2032BatteryEvaluator
-                evaluator = CR2032BatteryEvaluator()
-                eval_result = evaluator.evaluate_battery(device_result['voltage_mv'])
+                eval_result = BATTERY_EVALUATOR.evaluate_battery(device_result['voltage_mv'])
                 device_result.update({
                     'category': eval_result['category'],
                     'status': eval_result['status'],
@@ -856,7 +901,7 @@ def process_single_device(formatted_mac: str, qrcode: str) -> Dict:
                 # Fallback simple evaluation
                 device_result['category'] = 'UNKNOWN'
 
-            device_result['comment'] = f"RSSI {device_result.get('rssi')} | Battery {device_result.get('voltage_v')}V"
+            device_result['comment'] = RESULT_COMMENT_FMT % (device_result.get('rssi'), device_result.get('voltage_v'))
 
             # Send events
             failure_code = 'ALL-PASS-000' if device_result['pass_fail'] else 'ALL-FAIL-000'
@@ -879,6 +924,7 @@ def process_single_device(formatted_mac: str, qrcode: str) -> Dict:
             pass
 
     device_result['elapsed_s'] = perf_counter() - start_time
+    flush_manuf_events()
     return device_result
 
 
@@ -894,33 +940,11 @@ def process_mac_list(mac_list: List[str]):
     Returns a tuple: (results_list, metrics_dict)
     """
     # Resolve all entries to MACs first
-    targets: Dict[str, str] = {}
-    unresolved = []
-    for entry in mac_list:
-        if ':' in entry or len(entry) == 12:
-            targets[entry.upper()] = None
-        else:
-            qrcode = entry
-            try:
-                resp = requests.get(f'{QRMAC_ENDPOINT}?qrCode={qrcode}')
-                if resp.status_code == 200:
-                    data = resp.json()
-                    mac_address = data.get('macAddress', '')
-                    if mac_address:
-                        targets[mac_address.upper()] = qrcode
-                    else:
-                        print(f"MAC not found for QR: {qrcode}")
-                        unresolved.append(qrcode)
-                else:
-                    print(f"Failed to resolve QR {qrcode}: {resp.status_code}")
-                    unresolved.append(qrcode)
-            except Exception as e:
-                print(f"Error resolving QR {qrcode}: {e}")
-                unresolved.append(qrcode)
+    targets, unresolved = resolve_targets(mac_list)
 
     if not targets:
         print("No MACs to scan after resolving QR codes")
-        return [], {'total': 0, 'processed': 0, 'failed': 0, 'elapsed_s': 0}
+        return [], {'total': 0, 'processed': 0, 'passed': 0, 'failed': 0, 'elapsed_s': 0}
 
     # Prepare shared results store and pending set
     results: Dict[str, Dict] = {}
@@ -942,6 +966,9 @@ def process_mac_list(mac_list: List[str]):
         print_interval = 10 if total > 1000 else 5
         checkpoint_interval = max(100, total // 50)
         last_checkpoint = 0
+        # Checkpoints append only new results to a JSONL sidecar (no full rewrite)
+        checkpoint_jsonl = config.OUTPUT_JSON_FILE.replace('.json', '_checkpoint.jsonl')
+        checkpointed = 0
         while pending:
             now = time.time()
             processed_count = total - len(pending)
@@ -949,18 +976,10 @@ def process_mac_list(mac_list: List[str]):
             if total > 500 and processed_count > 0 and (processed_count - last_checkpoint) >= checkpoint_interval:
                 try:
                     partial_results = list(results.values())
-                    if partial_results:
-                        checkpoint_metrics = {
-                            'total': total,
-                            'processed': processed_count,
-                            'failed': len(pending),
-                            'elapsed_s': now - start_time,
-                            'checkpoint': True,
-                            'timestamp': datetime.now(dt_timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-                        }
-                        checkpoint_json = config.OUTPUT_JSON_FILE.replace('.json', '_checkpoint.json')
-                        checkpoint_csv = config.OUTPUT_CSV_FILE.replace('.csv', '_checkpoint.csv')
-                        save_results_batch(partial_results, checkpoint_json, checkpoint_csv, checkpoint_metrics)
+                    new_results = partial_results[checkpointed:]
+                    if new_results:
+                        append_results_jsonl(checkpoint_jsonl, new_results, truncate=checkpointed == 0)
+                        checkpointed = len(partial_results)
                         print(f"Checkpoint saved: {processed_count}/{total} devices")
                         last_checkpoint = processed_count
                 except Exception as e:
@@ -984,29 +1003,10 @@ def process_mac_list(mac_list: List[str]):
             except Exception as e:
                 print(f"Error closing driver: {e}")
 
-    # For any remaining pending MACs, mark as failed and optionally send events
-    for mac in list(pending):
-        qr = targets.get(mac)
-        entry = {
-            'qr_or_mac': qr or mac,
-            'voltage_v': None,
-            'voltage_mv': None,
-            'category': 'NO_DATA',
-            'status': 'FAIL',
-            'percentage_estimate': 0,
-            'pass_fail': False,
-            'rssi': None,
-            'comment': 'No data obtained'
-        }
-        results[mac] = entry
-        try:
-            if qr:
-                ManufEvent(qr, 'SCAN-FAIL-001', 'No data obtained')
-        except Exception as e:
-            print(f"Error sending failure event for {mac}: {e}")
-
-    # Build results list from results dict in input order
+    # Single pass in input order: build results list, filling pending MACs as failed
+    # (with an optional failure event) instead of a separate pass over pending
     results_list = []
+    pass_count = 0
     for mac, qr in targets.items():
         rec = results.get(mac)
         if not rec:
@@ -1021,11 +1021,20 @@ def process_mac_list(mac_list: List[str]):
                 'rssi': None,
                 'comment': 'No data obtained'
             }
+            results[mac] = rec
+            if qr and mac in pending:
+                try:
+                    ManufEvent(qr, 'SCAN-FAIL-001', 'No data obtained')
+                except Exception as e:
+                    print(f"Error sending failure event for {mac}: {e}")
+        elif rec.get('pass_fail'):
+            pass_count += 1
         results_list.append(rec)
 
     metrics = {
         'total': total,
         'processed': total - len(pending),
+        'passed': pass_count,
         'failed': len(pending),
         'elapsed_s': elapsed
     }
@@ -1039,6 +1048,12 @@ def process_mac_list(mac_list: List[str]):
     print(f"Processed: {metrics['processed']}")
     print(f"Failed: {metrics['failed']}")
     print(f"Elapsed (s): {metrics['elapsed_s']:.2f}")
+    # CR2032 category breakdown (Counter tallies in C; most common first)
+    categories = Counter(map(itemgetter('category'), results_list))
+    print("Categories: " + ", ".join(f"{name}={count}" for name, count in categories.most_common()))
+
+    # Per-device events were queued during the scan: wait for them (EVENT_FLUSH_TIMEOUT_S at most)
+    flush_manuf_events()
 
     return results_list, metrics
 
@@ -1055,8 +1070,8 @@ class DiscoveryObserver(BLEDriverObserver):
     def on_gap_evt_adv_report(self, ble_driver, conn_handle, peer_addr, rssi, adv_type, adv_data):
         if rssi < self.min_rssi_threshold:
             return
-        mac_address = ':'.join(f'{byte:02X}' for byte in peer_addr.addr).strip()
-        if mac_address in self.discovered_devices:
+        mac_address = format_mac_address(peer_addr.addr)
+        if mac_address in self.discovered_devices or not config.is_valid_mac(mac_address):
             return
         device_info = {
             'mac': mac_address,
@@ -1065,24 +1080,15 @@ class DiscoveryObserver(BLEDriverObserver):
             'has_battery_data': False,
             'battery_voltage': None
         }
-        for data_type, adv_payload in adv_data.records.items():
-            data_type_str = str(data_type)
-            if "complete_local_name" in data_type_str or "shortened_local_name" in data_type_str:
-                try:
-                    device_info['name'] = bytes(adv_payload).decode('utf-8', errors='ignore').strip()
-                except Exception:
-                    pass
-            elif "manufacturer_specific_data" in data_type_str:
-                device_info['has_battery_data'] = True
-                try:
-                    if len(adv_payload) == 26 and adv_payload[-2] == 179 and adv_payload[-3] == 255:
-                        battery_int = float(adv_payload[-1])
-                        battery_dec = float(adv_payload[-4]) / 100
-                        device_info['battery_voltage'] = battery_int + battery_dec
-                    elif len(adv_payload) >= 2:
-                        device_info['battery_voltage'] = float(adv_payload[-1]) / 10
-                except Exception:
-                    pass
+        # Direct record lookups instead of walking and stringifying every AD type
+        records = adv_data.records
+        name_payload = records.get(COMPLETE_NAME_TYPE) or records.get(SHORT_NAME_TYPE)
+        if name_payload:
+            device_info['name'] = bytes(name_payload).decode('utf-8', errors='ignore').strip()
+        adv_payload = records.get(MFG_DATA_TYPE)
+        if adv_payload is not None:
+            device_info['has_battery_data'] = True
+            device_info['battery_voltage'] = parse_battery_voltage(adv_payload)
         self.discovered_devices[mac_address] = device_info
         current_time = time.time()
         if current_time - self.last_print_time > 2:
@@ -1169,7 +1175,8 @@ def main():
                 else:
                     print("Failed to post batch summary event")
                 # Additionally, send CSV details in parts so each device row is stored in DB
-                parts = send_batch_csv_details(csv_path=config.OUTPUT_CSV_FILE, run_id=run_id, per_row=True)
+                parts = send_batch_csv_details(csv_path=config.OUTPUT_CSV_FILE, run_id=run_id, per_row=True,
+                                               rows_per_event=config.CSV_DETAIL_ROWS_PER_EVENT)
                 print(f"Posted {parts} CSV detail event(s)")
             except Exception as e:
                 print(f"Error sending batch summary/details: {e}")
@@ -1178,6 +1185,8 @@ def main():
     except Exception as e:
         print(f"Error in main: {e}")
     finally:
+        # Required MES records: do not leave queued per-device events to the atexit wait
+        flush_manuf_events()
         print("Scanner finished")
 
 
@@ -1,10 +1,15 @@
 # Configuration for BLE Scanner - Simplified Version
+import sys
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import FrozenSet, List, Dict
+from utils.advertising import normalize_mac_address
 
-@dataclass
+# Slotted dataclasses need Python 3.10+; older interpreters keep __dict__
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(frozen=True, **_SLOTS)
 class ScannerConfig:
-    """Simplified configuration for the universal BLE scanner"""
+    """Simplified configuration for the universal BLE scanner (read-only at runtime)"""
     
     # COM port configuration (used as fallback if auto-detection fails)
     COM_PORT: str = "COM6"  # Main port
@@ -48,9 +53,24 @@ class ScannerConfig:
     # Output files (Windows paths)
     OUTPUT_JSON_FILE: str = "c:/Battery-Scanner-Mini-White/results/scan_results.json"
     OUTPUT_CSV_FILE: str = "c:/Battery-Scanner-Mini-White/results/scan_results.csv"
+    JSON_SERIALIZER: str = "orjson"  # "orjson", "msgspec" (json if not installed) or "json"
+    JSON_PRETTY: bool = False  # Indent result JSON for human reading (compact otherwise)
+    CSV_WRITE_BUFFER: int = 1 << 20  # Write buffer (bytes) for result CSV files (1 MiB)
+    CSV_DETAIL_ROWS_PER_EVENT: int = 1  # >1 packs device rows into BATCH-ROWS-000 detail events (server must unpack them)
     
     # Valid MACs (empty list = accept any MAC)
     VALID_MAC_IDS: List[str] = field(default_factory=list)
+    # Normalized VALID_MAC_IDS for O(1) lookups (built in __post_init__)
+    _valid_mac_set: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Frozen dataclass: derived fields are set through object.__setattr__
+        object.__setattr__(self, '_valid_mac_set',
+                           frozenset(normalize_mac_address(mac) for mac in self.VALID_MAC_IDS))
+
+    def is_valid_mac(self, mac: str) -> bool:
+        """True if mac is accepted (an empty VALID_MAC_IDS accepts any MAC)"""
+        return not self._valid_mac_set or normalize_mac_address(mac) in self._valid_mac_set
 
 # Configuration instance
 config = ScannerConfig()
@@ -13,23 +13,47 @@ import sys
 from pathlib import Path
 
 
+# Output is collected and written in one go (console writes are slow on Windows);
+# flush_info() runs before each native import so a crash there still shows the report
+_out = []
+_stream = False
+
+
 def info(msg: str):
-    print(msg)
+    if _stream:
+        print(msg)
+    else:
+        _out.append(msg)
+
+
+def flush_info():
+    if _out:
+        sys.stdout.write('\n'.join(_out) + '\n')
+        sys.stdout.flush()
+        _out.clear()
+
+
+# Loaded DLLs by lower-cased name: (handle, path). Handles stay referenced so the
+# image remains pinned and a repeated probe never goes back to the Windows loader.
+_LOADED = {}
 
 
 def try_win_dll_load(name: str, paths):
     """Try to load a DLL by name. If paths is provided, try loading from those dirs first."""
+    key = name.lower()
+    if key in _LOADED:
+        return (True, _LOADED[key][1])
     last = None
     for p in paths:
         full = Path(p) / name
         try:
-            ctypes.WinDLL(str(full))
+            _LOADED[key] = (ctypes.WinDLL(str(full)), str(full))
             return (True, str(full))
         except OSError as e:
             last = e
     # try system search
     try:
-        ctypes.WinDLL(name)
+        _LOADED[key] = (ctypes.WinDLL(name), name)
         return (True, name)
     except OSError as e:
         return (False, str(last) if last is not None else str(e))
@@ -108,6 +132,7 @@ def main():
             info(f"os.add_dll_directory failed: {e}")
 
     info('\nAttempting to import the native SWIG module _pc_ble_driver_sd_api_v3')
+    flush_info()
     try:
         importlib.import_module('_pc_ble_driver_sd_api_v3')
         info('Import SUCCESS: _pc_ble_driver_sd_api_v3')
@@ -115,6 +140,7 @@ def main():
         info(f'Import FAILED: _pc_ble_driver_sd_api_v3 -> {e!r}')
 
     info('\nAttempting high-level import pc_ble_driver_py.ble_driver')
+    flush_info()
     try:
         import pc_ble_driver_py.ble_driver as bd
         info('Import SUCCESS: pc_ble_driver_py.ble_driver')
@@ -138,7 +164,13 @@ def main():
         info('\nNext steps: install the Microsoft Visual C++ Redistributable x64.\n')
     else:
         info('\nIf import still fails, run dependency walker (e.g., "Dependencies" app) on the .pyd to find the missing DLL.\n')
+    flush_info()
 
 
 if __name__ == '__main__':
-    main()
+    # --stream: print each line as it is produced instead of batching
+    _stream = '--stream' in sys.argv[1:]
+    try:
+        main()
+    finally:
+        flush_info()
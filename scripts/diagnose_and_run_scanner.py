@@ -12,6 +12,7 @@ import sys
 import importlib
 import traceback
 import subprocess
+import threading
 
 SITE_PKG = os.path.join(sys.prefix, 'Lib', 'site-packages')
 PKG_PATH = os.path.join(SITE_PKG, 'pc_ble_driver_py')
@@ -34,6 +35,14 @@ if os.name == 'nt' and os.path.isdir(DLL_DIR):
     try:
         print('\nCalling os.add_dll_directory(%r)' % DLL_DIR)
         dll_ctx = os.add_dll_directory(DLL_DIR)
+        # Pin the package DLLs once so the imports below do not probe the search path again
+        import ctypes
+        for name in os.listdir(DLL_DIR):
+            if name.lower().endswith('.dll'):
+                try:
+                    ctypes.WinDLL(os.path.join(DLL_DIR, name), winmode=0)
+                except OSError as e:
+                    print('  preload failed:', name, e)
     except Exception as e:
         print('  add_dll_directory failed:', e)
 else:
@@ -59,15 +68,38 @@ except Exception:
 SCANNER = os.path.join(os.getcwd(), 'ble_scanner.py')
 if os.path.exists(SCANNER):
     print('\nRunning ble_scanner.py and sending "y" to stdin (will run until scanner stops)')
+    preview = []
+
+    def drain_output(stream, limit=2000):
+        # Keep only the preview, but read everything so the scanner never blocks on a full pipe
+        kept = 0
+        for chunk in iter(lambda: stream.read(4096), ''):
+            if kept < limit:
+                preview.append(chunk[:limit - kept])
+                kept += len(preview[-1])
+
     try:
         proc = subprocess.Popen([sys.executable, SCANNER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        out, _ = proc.communicate('y\n', timeout=30)
+        reader = threading.Thread(target=drain_output, args=(proc.stdout,), daemon=True)
+        reader.start()
+        try:
+            proc.stdin.write('y\n')
+            proc.stdin.close()
+        except OSError:
+            pass  # Scanner already exited; its output is still drained
+        proc.wait(timeout=30)
+        reader.join()
         print('\n--- ble_scanner.py output (first 2000 chars) ---\n')
-        print(out[:2000])
+        print(''.join(preview))
         print('\n--- end output ---')
     except subprocess.TimeoutExpired:
         proc.kill()
+        proc.wait()
+        reader.join(timeout=5)
         print('\nScanner timed out (killed)')
+        if preview:
+            print('\n--- partial output ---\n')
+            print(''.join(preview))
     except Exception:
         print('\nFailed to run scanner:')
         traceback.print_exc()
@@ -11,11 +11,17 @@ Output always includes a qrcode column (fallback: 'no encontrado en la base de d
 from __future__ import annotations
 import csv
 import argparse
+import atexit
 from pathlib import Path
 import os
 import re
 import sys
-from typing import List, Dict, Optional, Iterable, Tuple, Set
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, List, Dict, Optional, Iterable, Iterator, Tuple, Set
 
 # dotenv optional
 try:
@@ -30,6 +36,14 @@ try:
 except ImportError:  # pragma: no cover
     pyodbc = None  # type: ignore
 
+# pyarrow optional (vectorized CSV ingest in load_rows)
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.compute as pc  # type: ignore
+    import pyarrow.csv as pa_csv  # type: ignore
+except ImportError:  # pragma: no cover
+    pa = None  # type: ignore
+
 EXPECTED_DEVICE_FIELDS = 10
 DEVICE_FIELD_NAMES = [
     'MAC','BATTERY_VOLTAGE_MV','BATTERY_VOLTAGE_V','STATUS','CONDITION','BATTERY_LEVEL',
@@ -41,6 +55,10 @@ ROOT = Path(__file__).resolve().parent.parent
 ENV_PATH = ROOT / '.env'
 
 FALLBACK_QR = 'no encontrado en la base de datos el QR'
+# Output CSV write buffer (1 MiB): fewer write syscalls on large exports
+WRITE_BUFFER = 1 << 20
+# --fuzzy-local pulls the whole table only up to this many rows (server join above it)
+FUZZY_LOCAL_MAX_ROWS = 2_000_000
 
 
 def load_env():
@@ -62,35 +80,93 @@ def load_env():
         except Exception as e:  # pragma: no cover
             print(f'Advertencia: fallback .env fallo: {e}', file=sys.stderr)
 
+_MAC_RE = re.compile(r'[^0-9A-Fa-f]')
+# Batch form: the separator survives the substitution so one pass covers every value
+_MAC_BATCH_SEP = '\n'
+_MAC_BATCH_RE = re.compile(r'[^0-9A-Fa-f\n]')
+
+
+# Memoized: DB lookups and repeated device rows normalize the same MACs many times
+@lru_cache(maxsize=1 << 20)
 def normalize_mac(value: str) -> str:
-    return re.sub(r'[^0-9A-Fa-f]', '', value or '').upper()
+    return _MAC_RE.sub('', value or '').upper()
+
+
+def normalize_macs(values: List[str]) -> List[str]:
+    """normalize_mac over a whole column: one regex pass and one upper() on the joined text."""
+    out = _MAC_BATCH_RE.sub('', _MAC_BATCH_SEP.join(values)).upper().split(_MAC_BATCH_SEP)
+    if len(out) != len(values):  # A value contained the separator
+        return [normalize_mac(v) for v in values]
+    return out
 
 
-def expand_notes_row(row: Dict[str,str], include_json: bool) -> Optional[List[str]]:
-    notes = (row.get('notes','') or '').strip().strip('"')
+def expand_notes_row(row: List[str], include_json: bool, cols: Tuple[int,int,int,int]) -> Optional[List[str]]:
+    """Expand one csv.reader row; cols are the stationID, failureCode, startTime and notes indexes."""
+    s_i, f_i, t_i, n_i = cols
+    notes = (row[n_i] or '').strip().strip('"')
     if not notes:
         return None
     if notes.startswith('{'):
         if include_json:
-            return [row['stationID'], row['failureCode'], row['startTime']] + [''] * EXPECTED_DEVICE_FIELDS
+            return [row[s_i], row[f_i], row[t_i]] + [''] * EXPECTED_DEVICE_FIELDS
         return None
     parts = notes.split(',')
     if len(parts) != EXPECTED_DEVICE_FIELDS:
         return None
-    return [row['stationID'], row['failureCode'], row['startTime']] + parts
+    return [row[s_i], row[f_i], row[t_i]] + parts
+
+
+def _load_rows_arrow(input_path: Path, include_json: bool) -> List[List[str]]:
+    """load_rows over a pyarrow table: trim/split/filter of notes run as columnar kernels."""
+    columns = BASE_FIELD_NAMES + ['notes']
+    tbl = pa_csv.read_csv(str(input_path), convert_options=pa_csv.ConvertOptions(
+        include_columns=columns, column_types={c: pa.string() for c in columns}))
+    # Same as (notes or '').strip().strip('"') per row
+    notes = pc.utf8_trim(pc.utf8_trim_whitespace(tbl['notes']), characters='"')
+    is_json = pc.starts_with(notes, '{')
+    parts = pc.split_pattern(notes, ',')
+    keep = pc.and_(pc.equal(pc.list_value_length(parts), EXPECTED_DEVICE_FIELDS), pc.invert(is_json))
+    if include_json:
+        keep = pc.or_(keep, is_json)
+    keep = pc.fill_null(keep, False)
+    base = zip(*(pc.filter(tbl[c], keep).to_pylist() for c in BASE_FIELD_NAMES))
+    json_empty = [''] * EXPECTED_DEVICE_FIELDS
+    return [[s, f, t] + (json_empty if j else p)
+            for (s, f, t), p, j in zip(base, pc.filter(parts, keep).to_pylist(),
+                                        pc.filter(is_json, keep).to_pylist())]
 
 
 def load_rows(input_path: Path, include_json: bool) -> List[List[str]]:
-    out: List[List[str]] = []
+    if pa is not None:
+        try:
+            return _load_rows_arrow(input_path, include_json)
+        except (pa.ArrowInvalid, KeyError):
+            pass  # Ragged rows or missing columns: row-by-row reader below
+    return list(expand_notes_stream(input_path, include_json))
+
+
+def expand_notes_stream(input_path: Path, include_json: bool) -> Iterator[List[str]]:
+    """Yield expanded rows one at a time (nothing retained): low-memory form of load_rows."""
     with input_path.open('r', encoding='utf-8', newline='') as fin:
-        reader = csv.DictReader(fin)
+        # Plain csv.reader + header indexes: no per-row dict as with DictReader
+        reader = csv.reader(fin)
+        header = next(reader, None)
+        if not header or 'notes' not in header:
+            return
+        idx = {h: i for i, h in enumerate(header)}
+        cols = (idx['stationID'], idx['failureCode'], idx['startTime'], idx['notes'])
+        width = max(cols) + 1
         for r in reader:
-            exp = expand_notes_row(r, include_json)
+            if len(r) < width:
+                if not r:
+                    continue  # Blank line (DictReader skipped these too)
+                r = r + [None] * (width - len(r))  # Short row: missing fields as in DictReader
+            exp = expand_notes_row(r, include_json, cols)
             if exp:
-                out.append(exp)
-    return out
+                yield exp
 
 
+@lru_cache(maxsize=1)
 def _detect_driver() -> str:
     if pyodbc is None:
         return ''
@@ -100,22 +176,60 @@ def _detect_driver() -> str:
     return '{' + (drivers[-1] if drivers else 'ODBC Driver 18 for SQL Server') + '}'
 
 
-def query_source(name: str, server: str, database: str, user: str, password: str,
-                 schema: str, table: str, macs: Iterable[str], chunk_size: int) -> Dict[str,str]:
-    mapping: Dict[str,str] = {}
-    if pyodbc is None:
-        print(f'Advertencia: pyodbc no disponible; omitiendo fuente {name}', file=sys.stderr)
-        return mapping
-    driver = _detect_driver()
-    conn_str = (
-        f'Driver={driver};Server=tcp:{server},1433;Database={database};Uid={user};Pwd={password};'
+def _conn_str(server: str, database: str, user: str, password: str) -> str:
+    return (
+        f'Driver={_detect_driver()};Server=tcp:{server},1433;Database={database};Uid={user};Pwd={password};'
         'Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;'
     )
-    mac_list = list(macs)
-    if not mac_list:
-        return mapping
+
+
+# Idle connections per connection string: enrich and fuzzy_lookup reuse the same
+# TCP+TLS sessions. A connection is used by one thread at a time (pyodbc rule).
+_idle_conns: Dict[str, list] = {}
+_idle_lock = threading.Lock()
+
+
+@contextmanager
+def _pooled_conn(conn_str: str):
+    with _idle_lock:
+        idle = _idle_conns.setdefault(conn_str, [])
+        conn = idle.pop() if idle else None
+    if conn is None:
+        conn = pyodbc.connect(conn_str)
+    try:
+        yield conn
+    except BaseException:
+        conn.close()  # State unknown after an error: do not hand it out again
+        raise
+    with _idle_lock:
+        idle.append(conn)
+
+
+@atexit.register
+def _close_pooled_conns():
+    with _idle_lock:
+        for conns in _idle_conns.values():
+            for conn in conns:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        _idle_conns.clear()
+
+
+@lru_cache(maxsize=32)
+def _in_sql(schema: str, table: str, n: int) -> str:
+    """SELECT ... WHERE macid IN (?,...,?) text for n parameters (shared by all workers)."""
+    placeholders = ','.join(['?']*n)
+    return f'SELECT qrcode, macid FROM [{schema}].[{table}] WHERE macid IN ({placeholders})'
+
+
+def _query_chunks(name: str, conn_str: str, schema: str, table: str,
+                  chunks: List[List[str]], total: int, first: bool) -> Dict[str,str]:
+    """Run the IN (...) lookups for chunks over one connection (pyodbc connections are per thread)."""
+    mapping: Dict[str,str] = {}
     try:
-        with pyodbc.connect(conn_str) as conn:
+        with _pooled_conn(conn_str) as conn:
             cur = conn.cursor()
             # Smoke test quick
             try:
@@ -124,31 +238,64 @@ def query_source(name: str, server: str, database: str, user: str, password: str
             except Exception as e:
                 print(f'Error verificación tabla {schema}.{table} ({name}): {e}', file=sys.stderr)
                 return mapping
-            for i in range(0, len(mac_list), chunk_size):
-                chunk = mac_list[i:i+chunk_size]
-                placeholders = ','.join(['?']*len(chunk))
-                sql = f'SELECT qrcode, macid FROM [{schema}].[{table}] WHERE macid IN ({placeholders})'
-                if i == 0:
-                    print(f'DEBUG {name}: batch {len(chunk)} (total {len(mac_list)})', file=sys.stderr)
+            # One statement text for every batch: SQL Server reuses a single cached plan
+            width = max(map(len, chunks))
+            sql = _in_sql(schema, table, width)
+            cur.arraysize = width
+            for i, chunk in enumerate(chunks):
+                if first and i == 0:
+                    print(f'DEBUG {name}: batch {len(chunk)} (total {total})', file=sys.stderr)
+                if len(chunk) < width:
+                    # Short last batch: repeat its last MAC (duplicates in IN match nothing new)
+                    chunk = chunk + [chunk[-1]] * (width - len(chunk))
                 cur.execute(sql, chunk)
-                for qrcode, macid in cur.fetchall():
-                    norm = normalize_mac(str(macid))
-                    if norm and norm not in mapping and qrcode:
-                        mapping[norm] = str(qrcode).strip()
+                while True:
+                    fetched = cur.fetchmany(width)
+                    if not fetched:
+                        break
+                    for qrcode, macid in fetched:
+                        norm = normalize_mac(str(macid))
+                        if norm and norm not in mapping and qrcode:
+                            mapping[norm] = str(qrcode).strip()
     except Exception as e:
         print(f'Error consultando {name}: {e}', file=sys.stderr)
     return mapping
 
 
+def query_source(name: str, server: str, database: str, user: str, password: str,
+                 schema: str, table: str, macs: Iterable[str], chunk_size: int,
+                 workers: int = 1) -> Dict[str,str]:
+    mapping: Dict[str,str] = {}
+    if pyodbc is None:
+        print(f'Advertencia: pyodbc no disponible; omitiendo fuente {name}', file=sys.stderr)
+        return mapping
+    conn_str = _conn_str(server, database, user, password)
+    mac_list = list(macs)
+    if not mac_list:
+        return mapping
+    chunks = [mac_list[i:i+chunk_size] for i in range(0, len(mac_list), chunk_size)]
+    workers = max(1, min(workers, len(chunks)))
+    if workers == 1:
+        return _query_chunks(name, conn_str, schema, table, chunks, len(mac_list), True)
+    # Chunks dealt round-robin to workers, each with its own connection
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        jobs = [pool.submit(_query_chunks, name, conn_str, schema, table, chunks[w::workers], len(mac_list), w == 0)
+                for w in range(workers)]
+    for job in jobs:
+        for norm, qrcode in job.result().items():
+            mapping.setdefault(norm, qrcode)
+    return mapping
+
+
 # MODIFIED: add internal_only & external_only parameters AND return remaining + mac_norms
-def enrich(rows: List[List[str]], chunk_size: int, internal_only: bool=False, external_only: bool=False) -> Tuple[Dict[str,str], Set[str], Dict[str,str]]:
+def enrich(rows: Iterable[List[str]], chunk_size: int, internal_only: bool=False, external_only: bool=False,
+           workers: int = 1) -> Tuple[Dict[str,str], Set[str], Dict[str,str]]:
     load_env()
     mac_norms: Dict[str,str] = {}
-    for r in rows:
-        if len(r) >= 4 and r[3].strip():
-            norm = normalize_mac(r[3])
-            if norm:
-                mac_norms.setdefault(norm, r[3].upper())
+    macs = [r[3] for r in rows if len(r) >= 4 and r[3].strip()]
+    for mac, norm in zip(macs, normalize_macs(macs)):
+        if norm:
+            mac_norms.setdefault(norm, mac.upper())
     all_norms = set(mac_norms.keys())
     print(f'INFO: MACs únicos a resolver: {len(all_norms)}', file=sys.stderr)
     ext_server = os.getenv('EXTERNAL_SERVER')
@@ -160,26 +307,35 @@ def enrich(rows: List[List[str]], chunk_size: int, internal_only: bool=False, ex
     int_user = os.getenv('MFG_SERVER_USER')
     int_pass = os.getenv('MFG_SERVER_PASS')
     mapping: Dict[str,str] = {}
+    ext_ready = not internal_only and all([ext_server, ext_db, ext_user, ext_pass])
+    int_ready = not external_only and all([int_server, int_db, int_user, int_pass])
+    # Both sources are queried at once; the internal one speculatively gets every MAC
+    # and is masked to what external left unresolved (external still wins)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        ext_job = (pool.submit(query_source, 'EXTERNAL', ext_server, ext_db, ext_user, ext_pass,
+                               'flexport','qrmac_db', all_norms, chunk_size, workers)
+                   if ext_ready else None)
+        int_job = (pool.submit(query_source, 'INTERNAL', int_server, int_db, int_user, int_pass,
+                               'trk','qrmac_db', all_norms, chunk_size, workers)
+                   if int_ready and all_norms else None)
     if not internal_only:
-        if all([ext_server, ext_db, ext_user, ext_pass]):
-            mapping.update(query_source('EXTERNAL', ext_server, ext_db, ext_user, ext_pass,
-                                        'flexport','qrmac_db', all_norms, chunk_size))
+        if ext_job is not None:
+            mapping.update(ext_job.result())
         else:
             print('Advertencia: Credenciales externas incompletas.', file=sys.stderr)
     remaining = all_norms - set(mapping.keys())
     print(f'INFO: Tras externa faltan {len(remaining)} MACs', file=sys.stderr)
     if not external_only:
-        if remaining and all([int_server, int_db, int_user, int_pass]):
-            mapping_internal = query_source('INTERNAL', int_server, int_db, int_user, int_pass,
-                                            'trk','qrmac_db', remaining if not internal_only else all_norms, chunk_size)
-            still = (remaining if not internal_only else all_norms) - set(mapping_internal.keys())
+        if remaining and int_job is not None:
+            mapping_internal = {k: v for k, v in int_job.result().items() if k in remaining}
+            still = remaining - set(mapping_internal.keys())
             if still:
                 colon_forms = [mac_norms[n] for n in still if n in mac_norms]
                 colon_plain = [normalize_mac(c) for c in colon_forms]
                 second_try_set = set(colon_plain) - set(mapping_internal.keys())
                 if second_try_set:
                     mapping_internal.update(query_source('INTERNAL2', int_server, int_db, int_user, int_pass,
-                                                         'trk','qrmac_db', second_try_set, chunk_size))
+                                                         'trk','qrmac_db', second_try_set, chunk_size, workers))
             for k,v in mapping_internal.items():
                 mapping.setdefault(k,v)
         else:
@@ -194,7 +350,64 @@ def enrich(rows: List[List[str]], chunk_size: int, internal_only: bool=False, ex
 
 
 # NEW: fuzzy lookup for remaining MACs using suffix patterns in internal first then external
-def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[str,str], chunk_size: int):
+def _fuzzy_join_matches(cur, schema: str, table: str, suffixes: Set[str]) -> Dict[str, Tuple[str, str]]:
+    """Server side: suffixes go to a temp table and are hash-joined against every
+    macid suffix (same matches as per-MAC LIKE '%suffix' queries, one scan)."""
+    found: Dict[str, Tuple[str, str]] = {}
+    # Pooled connection: a #fuzzy left by an earlier failed run may still exist
+    cur.execute("IF OBJECT_ID('tempdb..#fuzzy') IS NOT NULL DROP TABLE #fuzzy")
+    # tempdb's collation may differ from the source table's: match the database's
+    cur.execute('CREATE TABLE #fuzzy (s varchar(8) COLLATE DATABASE_DEFAULT PRIMARY KEY)')
+    cur.fast_executemany = True
+    cur.executemany('INSERT INTO #fuzzy (s) VALUES (?)', [(x,) for x in suffixes])
+    cur.execute(
+        f"SELECT m.s, q.qrcode, q.macid FROM [{schema}].[{table}] q "
+        "CROSS APPLY (VALUES (RIGHT(REPLACE(q.macid,':',''),6)), (RIGHT(REPLACE(q.macid,':',''),8)), "
+        "(RIGHT(q.macid,6)), (RIGHT(q.macid,8))) k(s) "
+        "JOIN #fuzzy m ON m.s = k.s"
+    )
+    for suffix, qrcode, macid in cur.fetchall():
+        found.setdefault(suffix, (qrcode, macid))
+    cur.execute('DROP TABLE #fuzzy')
+    return found
+
+
+def _fuzzy_like_lookup(cur, name: str, schema: str, table: str) -> Callable[[str], Optional[Tuple[str, str]]]:
+    """Fallback when the join fails: lookup(suffix) runs the per-suffix LIKE query
+    on demand (one full scan per call, so only suffixes a MAC still needs are queried)."""
+    sql = f"SELECT TOP 1 qrcode, macid FROM [{schema}].[{table}] WHERE REPLACE(macid,':','') LIKE ? OR macid LIKE ?"
+
+    def lookup(suffix: str) -> Optional[Tuple[str, str]]:
+        pattern = f'%{suffix}'
+        try:
+            cur.execute(sql, pattern, pattern)
+            return cur.fetchone()
+        except Exception as e:
+            print(f'FUZZY error {name} {suffix}: {e}', file=sys.stderr)
+            return None
+    return lookup
+
+
+def _fuzzy_local_matches(cur, schema: str, table: str, suffixes: Set[str]) -> Dict[str, Tuple[str, str]]:
+    """Client side: one full pull, then set probes on the same four macid suffixes as the join."""
+    found: Dict[str, Tuple[str, str]] = {}
+    cur.execute(f'SELECT qrcode, macid FROM [{schema}].[{table}]')
+    cur.arraysize = 5000
+    while True:
+        fetched = cur.fetchmany(5000)
+        if not fetched:
+            break
+        for qrcode, macid in fetched:
+            raw = str(macid).upper()
+            plain = raw.replace(':', '')
+            for key in (plain[-6:], plain[-8:], raw[-6:], raw[-8:]):
+                if key in suffixes and key not in found:
+                    found[key] = (qrcode, macid)
+    return found
+
+
+def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[str,str], chunk_size: int,
+                 local: bool = False):
     if not remaining:
         return
     if pyodbc is None:
@@ -208,16 +421,13 @@ def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[st
     int_db = os.getenv('INTERNAL_DATABASE') or os.getenv('TRACEABILITY_DATABASE')
     int_user = os.getenv('MFG_SERVER_USER')
     int_pass = os.getenv('MFG_SERVER_PASS')
-    driver = _detect_driver()
-    def _conn(s, db, u, p):
-        return pyodbc.connect(f'Driver={driver};Server=tcp:{s},1433;Database={db};Uid={u};Pwd={p};Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;')
     # Build ordered list of suffix strategies
     strategies = [6,8]
     def run_fuzzy(name, server, db, user, pwd, schema, table):
         if not all([server, db, user, pwd]):
             return
         try:
-            with _conn(server, db, user, pwd) as conn:
+            with _pooled_conn(_conn_str(server, db, user, pwd)) as conn:
                 cur = conn.cursor()
                 try:
                     cur.execute(f'SELECT TOP 1 qrcode, macid FROM [{schema}].[{table}]')
@@ -227,6 +437,21 @@ def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[st
                     return
                 to_try = list(remaining - set(mapping.keys()))
                 print(f'FUZZY {name}: intentando {len(to_try)} MACs', file=sys.stderr)
+                suffixes = {norm[-size:] for norm in to_try for size in strategies if len(norm) >= size}
+                if not suffixes:
+                    return
+                found: Optional[Dict[str, Tuple[str, str]]] = None
+                if local:
+                    cur.execute(f'SELECT COUNT(*) FROM [{schema}].[{table}]')
+                    if cur.fetchone()[0] <= FUZZY_LOCAL_MAX_ROWS:
+                        found = _fuzzy_local_matches(cur, schema, table, suffixes)
+                if found is None:
+                    try:
+                        found = _fuzzy_join_matches(cur, schema, table, suffixes)
+                    except Exception as e:
+                        # e.g. a collation conflict: keep the matches the LIKE queries find
+                        print(f'FUZZY error {name}: {e}; usando LIKE por sufijo', file=sys.stderr)
+                lookup = found.get if found is not None else _fuzzy_like_lookup(cur, name, schema, table)
                 for norm in to_try:
                     orig = mac_norms.get(norm, norm)
                     # Skip if already found during loop
@@ -236,20 +461,14 @@ def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[st
                         if len(norm) < size:
                             continue
                         suffix = norm[-size:]
-                        pattern = f'%{suffix}'
-                        sql = f"SELECT TOP 1 qrcode, macid FROM [{schema}].[{table}] WHERE REPLACE(macid,':','') LIKE ? OR macid LIKE ?"
-                        try:
-                            cur.execute(sql, pattern, pattern)
-                            row = cur.fetchone()
-                            if row:
-                                qrcode, macid = row
-                                n2 = normalize_mac(str(macid))
-                                if n2 and n2 not in mapping:
-                                    mapping[n2] = str(qrcode).strip()
-                                    print(f'FUZZY {name}: {orig} -> {qrcode} (sufijo {suffix})', file=sys.stderr)
-                                    break
-                        except Exception as e:
-                            print(f'FUZZY error {name} {orig}: {e}', file=sys.stderr)
+                        row = lookup(suffix)
+                        if row:
+                            qrcode, macid = row
+                            n2 = normalize_mac(str(macid))
+                            if n2 and n2 not in mapping:
+                                mapping[n2] = str(qrcode).strip()
+                                print(f'FUZZY {name}: {orig} -> {qrcode} (sufijo {suffix})', file=sys.stderr)
+                                break
         except Exception as e:
             print(f'FUZZY conexión falla {name}: {e}', file=sys.stderr)
     # Internal first, then external
@@ -259,20 +478,37 @@ def fuzzy_lookup(mapping: Dict[str,str], remaining: Set[str], mac_norms: Dict[st
 
 
 def apply_mapping(rows: List[List[str]], mapping: Dict[str,str]) -> List[List[str]]:
-    out: List[List[str]] = []
-    for r in rows:
-        mac = r[3] if len(r)>=4 else ''
-        norm = normalize_mac(mac)
-        qrcode = mapping.get(norm, FALLBACK_QR)
-        out.append(r + [qrcode])
-    return out
+    norms = normalize_macs([r[3] if len(r)>=4 else '' for r in rows])
+    get = mapping.get
+    fallback = FALLBACK_QR
+    return [r + [get(norm, fallback)] for r, norm in zip(rows, norms)]
+
+
+def iter_apply_mapping(rows: Iterable[List[str]], mapping: Dict[str,str], batch_size: int = 10000) -> Iterator[List[str]]:
+    """apply_mapping over a row stream, one batch at a time (bounded memory)."""
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        yield from apply_mapping(batch, mapping)
 
 
-def write_output(rows: List[List[str]], output_path: Path):
-    with output_path.open('w', encoding='utf-8', newline='') as f:
+def write_output(rows: Iterable[List[str]], output_path: Path) -> int:
+    """Write rows (list or stream) under OUTPUT_FIELD_NAMES; returns the row count."""
+    # csv.writer only: Arrow's write_csv quotes every string and ends lines with
+    # '\n', so the file would not match the stdlib (minimal quoting, '\r\n') output
+    with output_path.open('w', encoding='utf-8', newline='', buffering=WRITE_BUFFER) as f:
         w = csv.writer(f)
         w.writerow(OUTPUT_FIELD_NAMES)
-        w.writerows(rows)
+        if isinstance(rows, list):
+            w.writerows(rows)
+            return len(rows)
+        count = 0
+        writerow = w.writerow
+        for count, row in enumerate(rows, 1):
+            writerow(row)
+        return count
 
 
 def main():
@@ -281,10 +517,13 @@ def main():
     ap.add_argument('--output','-o', default='results/Results_extendent.csv')
     ap.add_argument('--include-json', action='store_true')
     ap.add_argument('--chunk-size', type=int, default=400)
+    ap.add_argument('--workers', type=int, default=4, help='Conexiones paralelas por fuente para los lotes IN (...)')
     ap.add_argument('--no-db', action='store_true')
+    ap.add_argument('--stream', action='store_true', help='Procesar en streaming (lee la entrada dos veces; para archivos muy grandes)')
     ap.add_argument('--internal-only', action='store_true', help='Consultar solo la base interna (trk)')
     ap.add_argument('--external-only', action='store_true', help='Consultar solo la base externa (flexport)')
     ap.add_argument('--fuzzy', action='store_true', help='Activar búsqueda fuzzy para MACs faltantes (sufijos)')
+    ap.add_argument('--fuzzy-local', action='store_true', help='Fuzzy: descargar la tabla y comparar sufijos en memoria (tablas pequeñas)')
     ap.add_argument('--export-missing', help='Ruta CSV para exportar MACs sin qrcode tras proceso')
     args = ap.parse_args()
 
@@ -296,29 +535,39 @@ def main():
     output_path = Path(args.output)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    rows = load_rows(input_path, include_json=args.include_json)
+    # --stream: rows are never held in memory; the input is read once for the MACs
+    # and again (in batches) while writing the output
+    rows: Iterable[List[str]]
+    if args.stream:
+        rows = expand_notes_stream(input_path, args.include_json)
+    else:
+        rows = load_rows(input_path, include_json=args.include_json)
 
     if args.no_db:
-        enriched = [r + [''] for r in rows]
+        enriched: Iterable[List[str]] = (r + [''] for r in rows) if args.stream else [r + [''] for r in rows]
     else:
-        mapping, remaining_set, mac_norms = enrich(rows, chunk_size=args.chunk_size, internal_only=args.internal_only, external_only=args.external_only)
+        mapping, remaining_set, mac_norms = enrich(rows, chunk_size=args.chunk_size, internal_only=args.internal_only, external_only=args.external_only,
+                                                   workers=args.workers)
         if args.fuzzy and remaining_set:
-            fuzzy_lookup(mapping, remaining_set, mac_norms, args.chunk_size)
+            fuzzy_lookup(mapping, remaining_set, mac_norms, args.chunk_size, local=args.fuzzy_local)
             # recompute remaining after fuzzy
             remaining_set = (set(mac_norms.keys()) - set(mapping.keys()))
-        enriched = apply_mapping(rows, mapping)
+        if args.stream:
+            enriched = iter_apply_mapping(expand_notes_stream(input_path, args.include_json), mapping)
+        else:
+            enriched = apply_mapping(rows, mapping)
         if args.export_missing:
             miss_path = Path(args.export_missing)
             miss_path.parent.mkdir(parents=True, exist_ok=True)
-            with miss_path.open('w', encoding='utf-8', newline='') as fmiss:
+            with miss_path.open('w', encoding='utf-8', newline='', buffering=WRITE_BUFFER) as fmiss:
                 w = csv.writer(fmiss)
                 w.writerow(['original_mac','normalized_mac'])
                 for norm in sorted(remaining_set):
                     w.writerow([mac_norms.get(norm, norm), norm])
             print(f'Exportados {len(remaining_set)} MACs faltantes a {miss_path}', file=sys.stderr)
 
-    write_output(enriched, output_path)
-    print(f'Wrote {len(enriched)} rows to {output_path} (con qrcode).')
+    written = write_output(enriched, output_path)
+    print(f'Wrote {written} rows to {output_path} (con qrcode).')
 
 if __name__ == '__main__':
     main()
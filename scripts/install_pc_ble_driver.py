@@ -7,6 +7,7 @@
 Run with the same Python interpreter used by your project (Python 3.10)."""
 import sys
 import os
+import glob
 import shutil
 import zipfile
 import urllib.request
@@ -22,9 +23,13 @@ def log(msg):
     print("[install_pc_ble_driver]", msg)
 
 
+DOWNLOAD_CHUNK = 1 << 20  # 1 MiB reads/writes while streaming downloads
+
+
 def download(url, dest):
     log(f"Downloading {url} -> {dest}")
-    urllib.request.urlretrieve(url, dest)
+    with urllib.request.urlopen(url) as resp, open(dest, 'wb') as f:
+        shutil.copyfileobj(resp, f, length=DOWNLOAD_CHUNK)
 
 
 def find_site_packages_for_current_python():
@@ -50,16 +55,12 @@ def main():
         extract_dir = os.path.join(tmp, 'extracted')
         with zipfile.ZipFile(zip_path, 'r') as z:
             z.extractall(extract_dir)
-        # locate sd_api_v3 dll under bin
-        dll_candidates = []
-        for root, dirs, files in os.walk(extract_dir):
-            for f in files:
-                if f.lower().endswith('.dll') and 'sd_api_v3' in f.lower():
-                    dll_candidates.append(os.path.join(root, f))
-        if not dll_candidates:
+        # locate sd_api_v3 dll under bin (one recursive *.dll glob, any case, first match)
+        dll_path = next((p for p in glob.iglob(os.path.join(extract_dir, '**', '*.[dD][lL][lL]'), recursive=True)
+                         if 'sd_api_v3' in os.path.basename(p).lower()), None)
+        if dll_path is None:
             log('No sd_api_v3 DLL found in the archive')
             return 2
-        dll_path = dll_candidates[0]
         log(f'Found DLL: {dll_path}')
 
         site_pkgs = find_site_packages_for_current_python()
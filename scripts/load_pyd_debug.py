@@ -4,21 +4,27 @@ import sys
 
 PYD = Path(r"C:\Users\Funtional2\AppData\Local\Programs\Python\Python310\Lib\site-packages\pc_ble_driver_py\lib\win\x86_64\_pc_ble_driver_sd_api_v3.pyd")
 
-print('pyd path:', PYD)
-print('exists:', PYD.exists())
+# Lines are written in batches (one console write each) rather than print per line
+out = [f'pyd path: {PYD}', f'exists: {PYD.exists()}']
 if not PYD.exists():
+    sys.stdout.write('\n'.join(out) + '\n')
     sys.exit(1)
+# Flush before loading: a crash inside the loader must not swallow the header
+sys.stdout.write('\n'.join(out) + '\n')
+sys.stdout.flush()
+out = []
 
 try:
     ctypes.WinDLL(str(PYD))
-    print('Loaded pyd successfully via ctypes.WinDLL')
+    out.append('Loaded pyd successfully via ctypes.WinDLL')
 except OSError as e:
-    print('Failed to load pyd via ctypes.WinDLL:')
-    print(repr(e))
+    out.append('Failed to load pyd via ctypes.WinDLL:')
+    out.append(repr(e))
     # Show Win32 error code if available
     try:
         import ctypes.wintypes as wt
         err = ctypes.get_last_error()
-        print('GetLastError:', err)
+        out.append(f'GetLastError: {err}')
     except Exception:
         pass
+sys.stdout.write('\n'.join(out) + '\n')
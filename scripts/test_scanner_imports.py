@@ -2,13 +2,43 @@
 """
 Quick test to verify the BLE scanner imports work with SD API v5.
 """
+import ctypes
+import importlib.util
 import os
 import sys
+from pathlib import Path
 
 # Set environment for SD API v5
 os.environ['__conn_ic_id__'] = 'NRF52'
 os.environ['SD_API_VER'] = '5'
 
+
+def prepare_dll_directory():
+    """Register pc_ble_driver_py's DLL folder once and pin its DLLs before the first import.
+    Python 3.8+ on Windows no longer resolves extension dependencies through PATH.
+    Returns the add_dll_directory handle (None when not applicable).
+    """
+    if os.name != 'nt' or not hasattr(os, 'add_dll_directory'):
+        return None
+    spec = importlib.util.find_spec('pc_ble_driver_py')
+    if spec is None or not spec.origin:
+        return None
+    dll_dir = Path(spec.origin).parent / 'lib' / 'win' / 'x86_64'
+    if not dll_dir.is_dir():
+        return None
+    handle = os.add_dll_directory(str(dll_dir))
+    for dll in dll_dir.glob('*.dll'):
+        try:
+            ctypes.WinDLL(str(dll), winmode=0)
+        except OSError:
+            pass  # The imports below report what is really missing
+    print(f"✓ DLL directory registered: {dll_dir}")
+    return handle
+
+
+# Keep the handle alive for the whole run
+_dll_dir_handle = prepare_dll_directory()
+
 try:
     import pc_ble_driver_py.config as pc_config
     pc_config.__conn_ic_id__ = 'NRF52'
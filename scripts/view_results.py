@@ -3,10 +3,95 @@
 Quick results viewer for BLE Scanner results.
 Shows summary of most recent scan results.
 """
-import json
 import os
+from itertools import chain, count, islice
+from operator import itemgetter, methodcaller
 from pathlib import Path
-from datetime import datetime
+
+# Optional orjson: faster parsing of large result files
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+# Optional ijson: stream the file instead of building the whole object tree
+try:
+    import ijson
+except Exception:
+    ijson = None
+
+PREVIEW_COUNT = 10
+
+_get_pass_fail = methodcaller('get', 'pass_fail', False)
+
+
+def load_results_json(json_file: Path) -> dict:
+    """Parse a results JSON file (orjson when installed, stdlib json otherwise)"""
+    if orjson is not None:
+        return orjson.loads(json_file.read_bytes())
+    import json  # deferred: only needed on this fallback path
+    with open(json_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _metric_counts(metrics: dict):
+    """(total, passed) recorded by the scanner in metrics, or None for older result files"""
+    total = metrics.get('total')
+    passed = metrics.get('passed')
+    if isinstance(total, int) and isinstance(passed, int):
+        return total, passed
+    return None
+
+
+def summarize_results_json(json_file: Path, preview: int = PREVIEW_COUNT):
+    """Return (metrics, first `preview` results, total results, passed count).
+    Totals come from metrics when the scanner recorded them; results are only
+    counted for files written before metrics carried a 'passed' field.
+    With ijson the file is streamed: metrics stop parsing at the end of their object
+    and results are visited one at a time, so memory stays flat for large runs.
+    """
+    if ijson is None:
+        data = load_results_json(json_file)
+        metrics = data.get('metrics', {})
+        results = data.get('results', [])
+        counts = _metric_counts(metrics)
+        if counts is None:
+            counts = len(results), sum(map(bool, map(_get_pass_fail, results)))
+        return (metrics, results[:preview]) + counts
+    with open(json_file, 'rb') as f:
+        metrics = next(ijson.items(f, 'metrics', use_float=True), {})
+    counts = _metric_counts(metrics)
+    with open(json_file, 'rb') as f:
+        devices = ijson.items(f, 'results.item', use_float=True)
+        first = list(islice(devices, preview))
+        if counts is not None:
+            # Stop parsing after the preview
+            return (metrics, first) + counts
+        # Only the preview is kept; the rest of the stream is counted and dropped
+        seen = count(len(first))
+        # zip() pulls one number per remaining device, so next(seen) ends up as the total
+        rest = map(itemgetter(0), zip(devices, seen))
+        passed = sum(map(bool, map(_get_pass_fail, chain(first, rest))))
+        total = next(seen)
+    return metrics, first, total, passed
+
+
+def _stat_files(directory: Path, names) -> dict:
+    """{name: stat_result} for the given file names present in directory.
+    One scandir pass: on Windows DirEntry.stat() reuses the directory listing (no extra syscall).
+    """
+    wanted = set(names)
+    found = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name in wanted and entry.is_file():
+                    found[entry.name] = entry.stat()
+                    if len(found) == len(wanted):
+                        break
+    except FileNotFoundError:
+        pass
+    return found
 
 def view_results():
     results_dir = Path("c:/Battery-Scanner-Mini-White/results")
@@ -18,22 +103,25 @@ def view_results():
     print(f"Results directory: {results_dir}")
     print()
     
+    # One directory listing: existence, size and mtime all come from it
+    stats = _stat_files(results_dir, (json_file.name, csv_file.name))
+    json_stat = stats.get(json_file.name)
+    csv_stat = stats.get(csv_file.name)
+    
     # Check if files exist
-    if not json_file.exists() and not csv_file.exists():
+    if json_stat is None and csv_stat is None:
         print("No results found. Run a scan first (option 3 in menu).")
         return
     
     # Display JSON results if available
-    if json_file.exists():
+    if json_stat is not None:
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            metrics, first, total, pass_count = summarize_results_json(json_file)
             
             print("📊 Latest Scan Results:")
             print("-" * 30)
             
             # Show metrics
-            metrics = data.get('metrics', {})
             print(f"Total devices: {metrics.get('total', 'N/A')}")
             print(f"Successfully processed: {metrics.get('processed', 'N/A')}")
             print(f"Failed: {metrics.get('failed', 'N/A')}")
@@ -41,24 +129,23 @@ def view_results():
             print()
             
             # Show sample results
-            results = data.get('results', [])
-            if results:
+            if total:
                 print("🔋 Sample devices found:")
                 print("-" * 30)
-                for i, device in enumerate(results[:10]):  # Show first 10
+                for i, device in enumerate(first):  # Show first PREVIEW_COUNT
                     mac = device.get('qr_or_mac', 'Unknown')
                     voltage = device.get('voltage_v', 0)
                     status = device.get('status', 'Unknown')
                     rssi = device.get('rssi', 'N/A')
                     print(f"{i+1:2d}. {mac} | {voltage:.2f}V | {status} | RSSI: {rssi}")
                 
-                if len(results) > 10:
-                    print(f"    ... and {len(results) - 10} more devices")
+                remaining = total - len(first)
+                if remaining > 0:
+                    print(f"    ... and {remaining} more devices")
                 print()
                 
                 # Show status summary
-                pass_count = sum(1 for r in results if r.get('pass_fail', False))
-                fail_count = len(results) - pass_count
+                fail_count = total - pass_count
                 print(f"✅ Passed: {pass_count}")
                 print(f"❌ Failed: {fail_count}")
                 print()
@@ -66,18 +153,19 @@ def view_results():
         except Exception as e:
             print(f"Error reading JSON results: {e}")
     
-    # Show file information
+    # Show file information (datetime is only needed from here on)
+    from datetime import datetime
     print("📁 Files available:")
     print("-" * 20)
     
-    if json_file.exists():
-        size = json_file.stat().st_size
-        modified = datetime.fromtimestamp(json_file.stat().st_mtime)
+    if json_stat is not None:
+        size = json_stat.st_size
+        modified = datetime.fromtimestamp(json_stat.st_mtime)
         print(f"JSON: {json_file.name} ({size:,} bytes, modified: {modified.strftime('%Y-%m-%d %H:%M:%S')})")
     
-    if csv_file.exists():
-        size = csv_file.stat().st_size
-        modified = datetime.fromtimestamp(csv_file.stat().st_mtime)
+    if csv_stat is not None:
+        size = csv_stat.st_size
+        modified = datetime.fromtimestamp(csv_stat.st_mtime)
         print(f"CSV:  {csv_file.name} ({size:,} bytes, modified: {modified.strftime('%Y-%m-%d %H:%M:%S')})")
     
     print()
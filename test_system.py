@@ -71,6 +71,47 @@ def test_battery_evaluator():
         return False
 
 
+def test_advertising_parser():
+    """Manufacturer data parser test (both protocols)"""
+    print("\nTesting advertising parser...")
+    
+    try:
+        from utils.advertising import format_mac_address, normalize_mac_address, parse_battery_voltage
+        
+        mac = format_mac_address([0xA4, 0xC1, 0x38, 0xAA, 0xBB, 0x01])
+        if mac != "A4:C1:38:AA:BB:01":
+            print(f"Unexpected MAC format: {mac}")
+            return False
+        print(f"MAC formatted: {mac}")
+        
+        for raw in ("a4c138aabb01", "A4-C1-38-AA-BB-01", "a4:c1:38:aa:bb:01"):
+            if normalize_mac_address(raw) != mac:
+                print(f"{raw} normalized to {normalize_mac_address(raw)} (expected {mac})")
+                return False
+        
+        
+        protocol1 = [0] * 22 + [5, 255, 179, 3]
+        protocol2 = [0x59, 0x00, 31]
+        
+        test_cases = [
+            (protocol1, 3.05),
+            (protocol2, 3.1),
+            ([31], None)
+        ]
+        
+        for payload, expected in test_cases:
+            voltage = parse_battery_voltage(payload)
+            if voltage != expected:
+                print(f"{payload} -> {voltage} (expected {expected})")
+                return False
+            print(f"{len(payload)}-byte payload -> {voltage} OK")
+        
+        return True
+    except Exception as e:
+        print(f"Advertising parser error: {e}")
+        return False
+
+
 def test_com_ports():
     """COM port detection test"""
     print("\nTesting COM port detection...")
@@ -112,6 +153,125 @@ def test_com_ports():
         return False
 
 
+def test_expanded_csv_writer():
+    """Expanded CSV output test (list and streaming writers)"""
+    print("\nTesting expanded CSV writer...")
+
+    try:
+        import csv
+        import io
+        import tempfile
+        from scripts.expand_results_notes import OUTPUT_FIELD_NAMES, write_output
+
+        width = len(OUTPUT_FIELD_NAMES)
+        samples = ["", "plain", "a,b", 'say "hi"', "line\nbreak", " padded ", "ñandú", "3.05"]
+        rows = [[samples[(i + j) % len(samples)] for j in range(width)] for i in range(20)]
+
+        expected = io.StringIO(newline='')
+        ref = csv.writer(expected)
+        ref.writerow(OUTPUT_FIELD_NAMES)
+        ref.writerows(rows)
+        expected = expected.getvalue().encode('utf-8')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            list_path = Path(tmp) / "list.csv"
+            stream_path = Path(tmp) / "stream.csv"
+            if write_output(rows, list_path) != len(rows) or write_output(iter(rows), stream_path) != len(rows):
+                print("Unexpected row count from write_output")
+                return False
+            list_bytes = list_path.read_bytes()
+            stream_bytes = stream_path.read_bytes()
+
+        if list_bytes != expected or stream_bytes != expected:
+            print("Expanded CSV output differs from csv.writer output")
+            return False
+
+        print(f"{len(rows)} rows written identically ({len(expected)} bytes)")
+        return True
+    except Exception as e:
+        print(f"Expanded CSV writer error: {e}")
+        return False
+
+
+def test_csv_detail_events():
+    """Batch CSV detail events test (post stubbed, nothing is sent)"""
+    print("\nTesting batch CSV detail events...")
+
+    try:
+        import json
+        import tempfile
+        from utils import telemetry
+
+        header = "qr_or_mac,mac,voltage_v,category,status,rssi,pass_fail,notes"
+        rows = [f"QR{i:03d},A4:C1:38:AA:BB:{i:02X},3.0{i % 10},GOOD,OK,-6{i % 10},{'true' if i % 3 else 'false'},"
+                for i in range(40)]
+        rows[7] += "señal débil " * 40  # one multi-byte row longer than max_notes_len
+        max_len = 300
+
+        posted = []
+        real_poster = telemetry._batch_poster
+        telemetry._batch_poster = lambda env, ts: lambda event: posted.append(event) or 200
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                csv_path = Path(tmp) / "details.csv"
+                csv_path.write_bytes((header + "\r\n" + "\r\n".join(rows) + "\r\n").encode("utf-8"))
+
+                # Chunked parts: every part repeats the header and breaks on a row edge
+                count = telemetry.send_batch_csv_details(str(csv_path), "RUN", max_notes_len=max_len,
+                                                         lines_per_event_hint=5)
+                parts = sorted(posted, key=lambda e: e['curr_qr'])
+                sent_rows = []
+                for event in parts:
+                    notes = event['notes'].decode('utf-8')  # strict: truncation kept whole characters
+                    lines = notes.split("\n")
+                    if lines[0] != header or len(event['notes']) > max_len or len(lines) > 6:
+                        print(f"Bad part {event['curr_qr']}: {len(lines)} lines, {len(event['notes'])} bytes")
+                        return False
+                    sent_rows.extend(lines[1:])
+                if count != len(parts) or len(sent_rows) != len(rows):
+                    print(f"{count} parts / {len(sent_rows)} rows posted (expected {len(rows)} rows)")
+                    return False
+                for sent, row in zip(sent_rows, rows):
+                    if sent != row and not (len(row.encode('utf-8')) > max_len and row.startswith(sent)):
+                        print(f"Part row {sent!r} does not match CSV row {row!r}")
+                        return False
+
+                # One event per row: long notes are cut on a UTF-8 character boundary
+                posted.clear()
+                telemetry.send_batch_csv_details(str(csv_path), "RUN", max_notes_len=max_len, per_row=True)
+                by_qr = {e['curr_qr']: e for e in posted}
+                long_notes = by_qr["QR007"]['notes']
+                if len(by_qr) != len(rows) or len(long_notes.encode('utf-8')) > max_len or not rows[7].startswith(long_notes):
+                    print(f"Bad per-row events: {len(by_qr)} events, QR007 notes {len(long_notes.encode('utf-8'))} bytes")
+                    return False
+                if by_qr["QR003"]['failure_code'] != 'ALL-FAIL-000' or by_qr["QR004"]['failure_code'] != 'ALL-PASS-000':
+                    print("Per-row failure codes do not follow the pass_fail column")
+                    return False
+
+                # rows_per_event grouping (default notes limit): full groups of 3 in row order
+                posted.clear()
+                count = telemetry.send_batch_csv_details(str(csv_path), "RUN", per_row=True, rows_per_event=3)
+                packed = sorted(posted, key=lambda e: e['curr_qr'])
+                groups = [json.loads(e['notes']) for e in packed]
+                if count != len(packed) or any(e['failure_code'] != 'BATCH-ROWS-000' for e in packed):
+                    print(f"{count} events posted, failure codes {set(e['failure_code'] for e in packed)}")
+                    return False
+                if [len(g) for g in groups] != [3] * (len(rows) // 3) + [len(rows) % 3]:
+                    print(f"Bad grouping: {[len(g) for g in groups]}")
+                    return False
+                if [item['row'] for g in groups for item in g] != rows:
+                    print("Packed rows out of order or changed")
+                    return False
+        finally:
+            telemetry._batch_poster = real_poster
+
+        print(f"{len(rows)} rows -> {len(parts)} parts, {len(groups)} packed row events")
+        return True
+    except Exception as e:
+        print(f"CSV detail events error: {e}")
+        return False
+
+
 def test_directory_structure():
     """Directory structure test"""
     print("\nTesting directory structure...")
@@ -198,7 +358,10 @@ def main():
     tests = [
         ("Imports", test_imports),
         ("Battery Evaluator", test_battery_evaluator),
+        ("Advertising Parser", test_advertising_parser),
         ("COM Ports", test_com_ports),
+        ("Expanded CSV Writer", test_expanded_csv_writer),
+        ("CSV Detail Events", test_csv_detail_events),
         ("Directory Structure", test_directory_structure),
         ("Nordic Driver", test_nordic_driver),
         ("Demo Scan", run_demo_scan)
@@ -0,0 +1,69 @@
+"""
+BLE advertising payload helpers for the universal scanner.
+
+- Formats peer addresses as colon-separated uppercase MAC strings
+- Normalizes operator/API supplied MACs to the same form
+- Decodes battery voltage from manufacturer specific data
+- Protocol 1 (ex Mini-Gold): 26-byte payload ending in <dec> 0xFF 0xB3 <int>
+- Protocol 2 (ex Mini-White): last byte is the voltage in tenths of a volt
+- No Nordic driver dependencies (payloads are plain byte sequences)
+"""
+from __future__ import annotations
+import binascii
+from typing import Optional, Sequence, Tuple
+
+_HEXLIFY = binascii.hexlify
+# Separators accepted in MAC input (removed in one C-level pass)
+_MAC_STRIP_TABLE = str.maketrans('', '', ':- ')
+
+PROTOCOL1_LENGTH = 26
+PROTOCOL1_MARKER = 255
+PROTOCOL1_TAG = 179
+
+
+def format_mac_address(addr: Sequence[int]) -> str:
+    """Return 'AA:BB:CC:DD:EE:FF' for a peer address (bytes in driver order).
+    Uses a single C-level hex encode for the usual 6-byte address.
+    """
+    if len(addr) != 6:
+        return ':'.join(f'{byte:02X}' for byte in addr)
+    h = _HEXLIFY(bytes(addr)).decode('ascii').upper()
+    return f"{h[0:2]}:{h[2:4]}:{h[4:6]}:{h[6:8]}:{h[8:10]}:{h[10:12]}"
+
+
+def normalize_mac_address(value: str) -> str:
+    """Return value as 'AA:BB:CC:DD:EE:FF' (accepts ':', '-', ' ' or no separators).
+    Input that is not 12 hex digits after stripping is only uppercased.
+    """
+    if len(value) == 17 and value[2::3] == ':::::':
+        # Already colon-separated (discovery output): only case may differ
+        return value.upper()
+    h = value.translate(_MAC_STRIP_TABLE).upper()
+    if len(h) != 12:
+        return value.upper()
+    return f"{h[0:2]}:{h[2:4]}:{h[4:6]}:{h[6:8]}:{h[8:10]}:{h[10:12]}"
+
+
+def mac_to_address(mac: str) -> Optional[Tuple[int, ...]]:
+    """Inverse of format_mac_address: 'AA:BB:...' -> (0xAA, 0xBB, ...).
+    Lets observers match raw peer addresses without formatting every advertisement.
+    Returns None when mac is not hexadecimal.
+    """
+    try:
+        return tuple(bytes.fromhex(mac.translate(_MAC_STRIP_TABLE)))
+    except ValueError:
+        return None
+
+
+def parse_battery_voltage(payload: Sequence[int]) -> Optional[float]:
+    """Return the battery voltage (V) carried in a manufacturer payload.
+    Tries the complex format (Protocol 1) first, then the simple one (Protocol 2).
+    Returns None when the payload is too short for either format.
+    """
+    # Byte values are ints; true division already yields the float result
+    length = len(payload)
+    if length == PROTOCOL1_LENGTH and payload[-2] == PROTOCOL1_TAG and payload[-3] == PROTOCOL1_MARKER:
+        return payload[-1] + payload[-4] / 100
+    if length >= 2:
+        return payload[-1] / 10
+    return None
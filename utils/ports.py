@@ -2,15 +2,18 @@
 Windows COM port auto-detection utilities for nRF52DK.
 
 - Primary source: pyserial (serial.tools.list_ports)
-- Fallback: WMIC parsing (legacy)
+- Fallbacks: HKLM\\HARDWARE\\DEVICEMAP\\SERIALCOMM registry map, then PowerShell CIM
 - Uses config.COM_PORT / COM_PORT_BACKUP as fallbacks
 - Controlled by config.AUTO_DETECT_COM
+- Port listings and probe results are cached (ports_cache_clear() resets them)
 """
 from __future__ import annotations
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import sys
 import subprocess
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     # Optional dependency; we'll handle absence gracefully
@@ -22,10 +25,39 @@ from config import config
 
 _DETECTED_COM_PORT: str | None = None
 
+# A listing is reused for PORT_LIST_TTL_S seconds (pyserial/CIM enumeration is slow).
+# Successful probes are kept for the process; failed ones expire with the same TTL
+# so a board plugged in later is still found.
+PORT_LIST_TTL_S = 5.0
+_port_list_cache: Optional[Tuple[float, List[Tuple[str, str, str]]]] = None
+_probe_cache: Dict[str, Tuple[float, bool]] = {}
+
+# Candidates are probed in parallel (each BLEDriver open/enable takes seconds)
+PROBE_WORKERS = 4
+
+
+def ports_cache_clear() -> None:
+    """Forget cached port listings, probe results and the detected port."""
+    global _port_list_cache, _DETECTED_COM_PORT
+    _port_list_cache = None
+    _probe_cache.clear()
+    _DETECTED_COM_PORT = None
+
 
 def _list_windows_com_ports() -> List[Tuple[str, str, str]]:
+    """Cached _scan_windows_com_ports() (see PORT_LIST_TTL_S)."""
+    global _port_list_cache
+    now = time.monotonic()
+    if _port_list_cache is not None and now - _port_list_cache[0] < PORT_LIST_TTL_S:
+        return list(_port_list_cache[1])
+    ports = _scan_windows_com_ports()
+    _port_list_cache = (now, ports)
+    return list(ports)
+
+
+def _scan_windows_com_ports() -> List[Tuple[str, str, str]]:
     """Return a list of (device, description, manufacturer) for Windows COM ports.
-    Tries pyserial first, then WMIC fallback.
+    Tries pyserial first, then the registry and CIM fallbacks.
     """
     ports: List[Tuple[str, str, str]] = []
     # Try pyserial
@@ -39,47 +71,81 @@ def _list_windows_com_ports() -> List[Tuple[str, str, str]]:
                     ports.append((dev, desc, mfg))
         except Exception:
             pass
-    # Fallback to WMIC if nothing found
+    # Fallbacks (Windows): SERIALCOMM registry map, then PowerShell CIM
     if not ports and sys.platform.startswith('win'):
-        try:
-            out = subprocess.check_output(
-                [
-                    'wmic', 'path', 'Win32_SerialPort',
-                    'get', 'DeviceID,Name,Description,Manufacturer'
-                ],
-                stderr=subprocess.STDOUT,
-                text=True,
-                timeout=5,
-            )
-            for line in out.splitlines():
-                line = line.strip()
-                if not line or 'DeviceID' in line:
-                    continue
-                # Heuristic: find token like COM<number>
-                m = re.search(r'(COM\d+)', line, re.IGNORECASE)
-                if m:
-                    dev = m.group(1).upper()
-                    # Split description/manufacturer if possible
-                    parts = [s.strip() for s in line.split('  ') if s.strip()]
-                    desc = parts[0] if parts else ''
-                    mfg = parts[-1] if parts else ''
-                    ports.append((dev, desc, mfg))
-        except Exception:
-            pass
+        ports = _list_via_winreg() or _list_via_cim()
+    return ports
+
+
+def _list_via_winreg() -> List[Tuple[str, str, str]]:
+    """COM ports from the SERIALCOMM registry map (no subprocess).
+    The value name (driver device path, e.g. \\Device\\JLinkCDC_UART_0) is used as description.
+    """
+    ports: List[Tuple[str, str, str]] = []
+    try:
+        import winreg  # type: ignore
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r'HARDWARE\DEVICEMAP\SERIALCOMM') as key:
+            i = 0
+            while True:
+                try:
+                    name, dev, _ = winreg.EnumValue(key, i)
+                except OSError:
+                    break  # No more values
+                i += 1
+                if isinstance(dev, str) and dev.upper().startswith('COM'):
+                    ports.append((dev.upper(), name, ''))
+    except Exception:
+        pass
+    return ports
+
+
+def _list_via_cim() -> List[Tuple[str, str, str]]:
+    """COM ports from Get-CimInstance Win32_SerialPort (tab-separated, no text heuristics)."""
+    ports: List[Tuple[str, str, str]] = []
+    try:
+        out = subprocess.check_output(
+            [
+                'powershell', '-NoProfile', '-NonInteractive', '-Command',
+                'Get-CimInstance Win32_SerialPort | ForEach-Object { "$($_.DeviceID)`t$($_.Name)`t$($_.Description)" }'
+            ],
+            stderr=subprocess.DEVNULL,
+            text=True,
+            timeout=5,
+        )
+        for line in out.splitlines():
+            dev, _, rest = line.strip().partition('\t')
+            if dev.upper().startswith('COM'):
+                name, _, desc = rest.partition('\t')
+                ports.append((dev.upper(), name, desc))
+    except Exception:
+        pass
     return ports
 
 
 essential_tags = (
     'j-link', 'segger', 'nordic', 'nrf', 'pca100', 'nrf52', 'dk'
 )
+# Compiled once at import: one alternation search per port instead of a substring scan per tag
+_TAG_RE = re.compile('|'.join(map(re.escape, essential_tags)))
+_COM_NUM_RE = re.compile(r'COM(\d+)$')
 
 
 def _sort_com(dev: str) -> int:
-    m = re.match(r'COM(\d+)$', dev.upper())
+    m = _COM_NUM_RE.match(dev.upper())
     return int(m.group(1)) if m else 10_000
 
 
 def _probe_port(port: str) -> bool:
+    """Cached _probe_port_uncached(port): each BLEDriver open/enable probe takes seconds."""
+    cached = _probe_cache.get(port)
+    if cached is not None and (cached[1] or time.monotonic() - cached[0] < PORT_LIST_TTL_S):
+        return cached[1]
+    ok = _probe_port_uncached(port)
+    _probe_cache[port] = (time.monotonic(), ok)
+    return ok
+
+
+def _probe_port_uncached(port: str) -> bool:
     """Try to open/enable/close the BLE driver on a port. Return True if it works.
     This helps choose between multiple COM ports (e.g., COM3/COM4).
     """
@@ -108,6 +174,30 @@ def _probe_port(port: str) -> bool:
         return False
 
 
+def _first_responsive(candidates: List[str]) -> Optional[str]:
+    """Probe candidates concurrently; return the first responsive one in candidate order.
+    There is no deadline (a slow adapter is still found, as with serial probing), and
+    the returned port's probe has finished and closed its driver. When nothing responds,
+    every probe has finished, so a fallback port is not still held open by a probe.
+    Probes of lower-priority ports may still be finishing when a port is returned.
+    """
+    candidates = list(dict.fromkeys(candidates))  # never two concurrent probes of one port
+    if len(candidates) <= 1:
+        return candidates[0] if candidates and _probe_port(candidates[0]) else None
+    ex = ThreadPoolExecutor(max_workers=min(PROBE_WORKERS, len(candidates)))
+    futures = [ex.submit(_probe_port, port) for port in candidates]
+    try:
+        for port, fut in zip(candidates, futures):
+            if fut.result():
+                return port
+        return None
+    finally:
+        # Not-yet-started probes are dropped; running ones finish (and close) in the background
+        for fut in futures:
+            fut.cancel()
+        ex.shutdown(wait=False)
+
+
 def autodetect_com_port() -> str:
     """Detect the nRF52DK COM port on Windows using common identifiers.
     Preference order:
@@ -122,6 +212,9 @@ def autodetect_com_port() -> str:
         if getattr(config, 'COM_PORT', None):
             return config.COM_PORT
         raise RuntimeError('No COM ports detected. Connect the nRF52DK and try again.')
+    if len(ports) == 1:
+        # Single port (the usual one-DK station): every path below ends on it, probe or not
+        return ports[0][0]
 
     available = [dev for dev, _, _ in ports]
 
@@ -129,7 +222,7 @@ def autodetect_com_port() -> str:
     tagged = []
     for dev, desc, mfg in ports:
         text = f"{dev} {desc} {mfg}".lower()
-        if any(tag in text for tag in essential_tags):
+        if _TAG_RE.search(text):
             tagged.append(dev)
     tagged = sorted(set(tagged), key=_sort_com)
 
@@ -141,12 +234,14 @@ def autodetect_com_port() -> str:
 
     rest = [d for d in sorted(available, key=_sort_com) if d not in tagged and d not in cfg]
 
-    candidates: List[str] = tagged + cfg + rest
+    # A port can be both tagged and configured: probe it once (two concurrent
+    # opens of one COM port make one of them fail on a busy port)
+    candidates: List[str] = list(dict.fromkeys(tagged + cfg + rest))
 
     # Probe candidates
-    for port in candidates:
-        if _probe_port(port):
-            return port
+    port = _first_responsive(candidates)
+    if port:
+        return port
 
     # Nothing responsive; choose a sane default
     if getattr(config, 'COM_PORT', None) in available:
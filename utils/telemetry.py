@@ -6,14 +6,25 @@ Telemetry and centralization utilities for BLE scanner results.
 """
 from __future__ import annotations
 
+import atexit
 import json
 import os
 import hashlib
+import mmap
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, List
+from types import MappingProxyType
+from urllib.parse import quote_plus, urlencode
+from typing import Callable, Deque, Dict, Iterable, Iterator, Mapping, Optional, List, Union
 from datetime import datetime, timezone
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Lazy import to avoid hard dependency at import time
 try:
@@ -21,81 +32,289 @@ try:
 except Exception:
     load_dotenv = None  # type: ignore
 
+# Optional orjson: faster compact JSON for summary notes
+try:
+    import orjson
+except Exception:
+    orjson = None  # type: ignore
+
 MANUF_API_URL = os.getenv("MANUF_API_URL", "http://20.97.201.175:6699/postManufEvent")
+# Read buffer for streaming the results CSV in send_batch_csv_details
+CSV_READ_BUFFER = 1 << 20
+# Concurrent per-row detail posts (also the session's connection pool size)
+DETAIL_POST_WORKERS = 16
+
+
+def _make_session() -> requests.Session:
+    """Shared session: events reuse one keep-alive connection instead of a TCP handshake per post.
+    Connect errors are not retried (connect=0): with the API unreachable each event costs one
+    10 s timeout, not three. urllib3 does not re-send POSTs on read errors or statuses either.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=DETAIL_POST_WORKERS,
+                          max_retries=Retry(total=2, connect=0, backoff_factor=0.2))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def load_env() -> Dict[str, str]:
-    """Load .env and return relevant settings."""
+_SESSION: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """The shared session, created on the first post (importing this module opens nothing)."""
+    global _SESSION
+    if _SESSION is None:
+        with _session_lock:
+            if _SESSION is None:
+                _SESSION = _make_session()
+    return _SESSION
+
+
+@lru_cache(maxsize=1)
+def load_env() -> Mapping[str, str]:
+    """Load .env and return relevant settings (read-only).
+    Cached for the run: .env is parsed once, not on every posted event.
+    Call load_env.cache_clear() to pick up changes.
+    """
     if load_dotenv is not None:
         try:
             load_dotenv()
         except Exception:
             pass
-    return {
+    return MappingProxyType({
         "station_id": os.getenv("STATION_ID", "269"),
         "operator_id": os.getenv("OPERATOR_ID", "Pilot"),
         "api_url": os.getenv("MANUF_API_URL", MANUF_API_URL),
-    }
+    })
 
 
 def format_ts(dt: datetime) -> str:
     """Format datetime as 'YYYY-MM-DD HH:MM:SS.fff' in UTC (no timezone suffix)."""
-    dt_utc = dt.astimezone(timezone.utc)
+    return _format_utc(dt.astimezone(timezone.utc))
+
+
+# Batch posts reuse one start/end time for every event: format each instant once
+@lru_cache(maxsize=256)
+def _format_utc(dt_utc: datetime) -> str:
     # Milliseconds precision
     return dt_utc.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
 
 
-# Retained helper (unused now) in case future needs arise
-def _read_csv_head(csv_path: str, max_lines: int = 80) -> str:
-    try:
-        p = Path(csv_path)
-        if not p.exists():
-            return ""
-        lines = []
-        with p.open("r", encoding="utf-8", errors="ignore") as fh:
-            for i, line in enumerate(fh):
-                lines.append(line.rstrip("\n"))
-                if i + 1 >= max_lines:
-                    break
-        return "\n".join(lines)
-    except Exception:
-        return ""
+# Read size for the non-mmap hashing path (1 MiB: few Python-level read() calls)
+_SHA_CHUNK = 1 << 20
+_file_digest = getattr(hashlib, "file_digest", None)
 
 
 def _sha256_file(path: str) -> Optional[str]:
     try:
         h = hashlib.sha256()
         with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(8192), b""):
-                h.update(chunk)
+            try:
+                # Whole file in one update() call over a read-only mapping
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+            except (ValueError, OSError):
+                # Empty files (and filesystems without mmap) cannot be mapped
+                if _file_digest is not None:
+                    # Python 3.11+: read/update loop runs in C
+                    return _file_digest(f, "sha256").hexdigest()
+                for chunk in iter(lambda: f.read(_SHA_CHUNK), b""):
+                    h.update(chunk)
         return h.hexdigest()
     except Exception:
         return None
 
 
-def post_manuf_event(curr_qr: str, failure_code: str, start_time: datetime, end_time: datetime, notes: str,
-                     station_id: str, operator_id: str, api_url: Optional[str] = None) -> Optional[int]:
-    """Post a manufacturing event using form-encoded params. Returns HTTP status or None on exception."""
+# csv sha256 by (path, mtime_ns, size): summaries/retries of an unchanged CSV skip rehashing
+_SHA_CACHE: Dict[tuple, str] = {}
+_SHA_CACHE_MAX = 64
+
+
+def _cached_sha256(path: str) -> Optional[str]:
+    """_sha256_file(path), reused while the file's mtime and size are unchanged."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+    sha = _SHA_CACHE.get(key)
+    if sha is None:
+        disk_key = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+        sha = _disk_sha_get(disk_key)
+        if sha is None:
+            sha = _sha256_file(path)
+            if sha is not None:
+                _disk_sha_put(disk_key, sha)
+        if sha is not None:
+            if len(_SHA_CACHE) >= _SHA_CACHE_MAX:
+                del _SHA_CACHE[next(iter(_SHA_CACHE))]  # FIFO: oldest entry first
+            _SHA_CACHE[key] = sha
+    return sha
+
+
+# Same cache persisted across runs (a summary re-sent after a restart skips the hash)
+SHA_DISK_CACHE_PATH = Path(os.getenv("LOCALAPPDATA") or os.getenv("XDG_CACHE_HOME")
+                           or Path.home() / ".cache") / "battery-scanner" / "sha.json"
+_SHA_DISK_MAX = 256
+_sha_disk: Optional[Dict[str, str]] = None
+
+
+def _load_sha_disk() -> Dict[str, str]:
+    global _sha_disk
+    if _sha_disk is None:
+        try:
+            with open(SHA_DISK_CACHE_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            _sha_disk = data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            _sha_disk = {}
+    return _sha_disk
+
+
+def _disk_sha_get(key: str) -> Optional[str]:
+    cache = _load_sha_disk()
+    sha = cache.pop(key, None)
+    if not isinstance(sha, str):
+        return None
+    cache[key] = sha  # LRU: most recently used last (persisted with the next write)
+    return sha
+
+
+def _disk_sha_put(key: str, sha: str) -> None:
+    """Record sha and rewrite the cache file atomically (temp file + os.replace); best-effort."""
+    cache = _load_sha_disk()
+    cache[key] = sha
+    while len(cache) > _SHA_DISK_MAX:
+        del cache[next(iter(cache))]
+    tmp = SHA_DISK_CACHE_PATH.with_name(f"{SHA_DISK_CACHE_PATH.name}.{os.getpid()}.tmp")
+    try:
+        SHA_DISK_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, separators=(",", ":"))
+        os.replace(tmp, SHA_DISK_CACHE_PATH)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def post_manuf_event(curr_qr: str, failure_code: str, start_time: Union[datetime, str], end_time: Union[datetime, str],
+                     notes: str, station_id: str, operator_id: str, api_url: Optional[str] = None) -> Optional[int]:
+    """Post a manufacturing event using form-encoded params. Returns HTTP status or None on exception.
+    start_time/end_time may be given already formatted by format_ts (batch senders format once).
+    """
     url = api_url or MANUF_API_URL
     params = {
         'currQr': curr_qr,
         'stationID': station_id,
         'operatorID': operator_id,
         'failureCode': failure_code,
-        'startTime': format_ts(start_time),
-        'endTime': format_ts(end_time),
+        'startTime': start_time if isinstance(start_time, str) else format_ts(start_time),
+        'endTime': end_time if isinstance(end_time, str) else format_ts(end_time),
         'notes': notes,
     }
     try:
-        resp = requests.post(url, data=params, timeout=10)
+        resp = _get_session().post(url, data=params, timeout=10)
         return resp.status_code
     except Exception:
         return None
 
 
+# Per-device events are posted by a background thread so scan callbacks never wait on the API
+# End-of-scan flush limit: events still queued after it keep posting in the background
+EVENT_FLUSH_TIMEOUT_S = 60.0
+# atexit fallback wait: EVENT_DRAIN_TIMEOUT_S plus this much per still-pending event
+# (a post is bounded by its 10 s timeout; connect errors are not retried)
+EVENT_DRAIN_TIMEOUT_S = 5.0
+EVENT_DRAIN_PER_EVENT_S = 10.0
+_EVENT_QUEUE: "queue.SimpleQueue" = queue.SimpleQueue()
+_event_worker: Optional[threading.Thread] = None
+# Events queued but not yet posted; flushers wait on the condition until it is 0
+_events_pending = 0
+_events_done = threading.Condition()
+
+
+def _event_worker_loop() -> None:
+    global _events_pending
+    while True:
+        kwargs, callback = _EVENT_QUEUE.get()
+        try:
+            status = post_manuf_event(**kwargs)
+            if callback is not None:
+                try:
+                    callback(status)
+                except Exception:
+                    pass
+        finally:
+            with _events_done:
+                _events_pending -= 1
+                if not _events_pending:
+                    _events_done.notify_all()
+
+
+def enqueue_manuf_event(callback: Optional[Callable[[Optional[int]], None]] = None, **kwargs) -> None:
+    """Queue post_manuf_event(**kwargs) for the background poster thread and return at once.
+    callback(status) runs on that thread after the post. Call flush_manuf_events() before
+    relying on the events having been sent (atexit only waits a bounded time).
+    """
+    global _event_worker, _events_pending
+    with _events_done:
+        if _event_worker is None:
+            _event_worker = threading.Thread(target=_event_worker_loop, name="manuf-events", daemon=True)
+            _event_worker.start()
+        _events_pending += 1
+    _EVENT_QUEUE.put((kwargs, callback))
+
+
+def pending_manuf_events() -> int:
+    """Number of queued per-device events not posted yet."""
+    with _events_done:
+        return _events_pending
+
+
+def flush_manuf_events(timeout: Optional[float] = EVENT_FLUSH_TIMEOUT_S) -> bool:
+    """Wait until every queued event has been posted, at most timeout seconds (None waits
+    without limit). Returns True when drained; otherwise prints how many events were left unposted.
+    """
+    with _events_done:
+        if _events_done.wait_for(lambda: not _events_pending, timeout):
+            return True
+        left = _events_pending
+    print(f"Warning: {left} manufacturing event(s) not posted (gave up waiting after {timeout:g}s)")
+    return False
+
+
+def _shutdown() -> None:
+    """atexit: post what is still queued (bounded by queue depth), then close the shared session."""
+    flush_manuf_events(EVENT_DRAIN_TIMEOUT_S + pending_manuf_events() * EVENT_DRAIN_PER_EVENT_S)
+    if _SESSION is not None:
+        _SESSION.close()
+
+
+atexit.register(_shutdown)
+
+
+def _compact_json(data: Dict) -> str:
+    """json.dumps(data, separators=(',', ':')) via orjson when installed.
+    Falls back to json when orjson cannot encode data or the output is not ASCII
+    (json escapes non-ASCII characters, which the varchar notes column relies on).
+    """
+    if orjson is not None:
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+            if payload.isascii():
+                return payload.decode('ascii')
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(',', ':'))
+
+
 def build_summary_notes(metrics: Dict, csv_path: str, run_id: str, app_version: str = "", driver_version: str = "") -> str:
     """Build minimal compact JSON notes (no CSV snippet)."""
-    sha = _sha256_file(csv_path)
+    sha = _cached_sha256(csv_path)
     base = {
         'run_id': run_id,
         'totals': metrics,
@@ -105,7 +324,7 @@ def build_summary_notes(metrics: Dict, csv_path: str, run_id: str, app_version:
         'driver_version': driver_version,
         'tz': 'UTC'
     }
-    notes = json.dumps(base, separators=(',', ':'))
+    notes = _compact_json(base)
     # Keep a hard limit just in case
     if len(notes) > 7900:
         notes = notes[:7900] + '...'
@@ -130,11 +349,50 @@ def send_batch_summary(metrics: Dict, csv_path: str, run_start: datetime, run_en
     return status
 
 
-def send_batch_csv_details(csv_path: str, run_id: str, max_notes_len: int = 7900, lines_per_event_hint: int = 120, *, per_row: bool = False) -> int:
+def _truncate_utf8(text: str, max_bytes: int) -> str:
+    """text cut to at most max_bytes of UTF-8, never inside a character."""
+    if text.isascii():
+        return text[:max_bytes]
+    data = text.encode('utf-8')
+    return text if len(data) <= max_bytes else data[:max_bytes].decode('utf-8', 'ignore')
+
+
+# pass_fail column values that mark a failed device row
+_FAIL_TOKENS = frozenset(('false', '0', 'no'))
+
+
+_FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def _batch_poster(env: Mapping[str, str], ts: str) -> Callable[[Dict], Optional[int]]:
+    """Return post(event) for a batch's events (dicts with curr_qr, failure_code, notes; notes may be UTF-8 bytes).
+    Station, operator and times are the same for every event of a batch, so that part
+    of the form body is encoded once; per event only the three varying fields are quoted.
+    """
+    url = env['api_url'] or MANUF_API_URL
+    station = urlencode({'stationID': env['station_id'], 'operatorID': env['operator_id']})
+    times = urlencode({'startTime': ts, 'endTime': ts})
+
+    def post(event: Dict) -> Optional[int]:
+        # Same field order and encoding as post_manuf_event's form dict
+        body = (f"currQr={quote_plus(event['curr_qr'])}&{station}&failureCode={quote_plus(event['failure_code'])}"
+                f"&{times}&notes={quote_plus(event['notes'])}")
+        try:
+            resp = _get_session().post(url, data=body, headers=_FORM_HEADERS, timeout=10)
+            return resp.status_code
+        except Exception:
+            return None
+    return post
+
+
+def send_batch_csv_details(csv_path: str, run_id: str, max_notes_len: int = 7900, lines_per_event_hint: int = 120, *, per_row: bool = False,
+                           rows_per_event: int = 1) -> int:
     """Send CSV content to the DB as manufacturing events.
     Modes:
     - per_row=False (default): send in parts with many rows per event (failureCode='BATCH-DETAIL-000').
     - per_row=True: send one event per device row (failureCode='BATCH-ROW-000'), currQr set to the first CSV column (qr_or_mac).
+      With rows_per_event > 1, up to that many row events are packed into one 'BATCH-ROWS-000' event whose
+      notes are a JSON list of {"qr", "fc", "row"} (only for servers that unpack these events).
     Returns count of events posted (best-effort).
     """
     env = load_env()
@@ -143,77 +401,133 @@ def send_batch_csv_details(csv_path: str, run_id: str, max_notes_len: int = 7900
         return 0
 
     try:
-        lines: List[str] = p.read_text(encoding='utf-8', errors='ignore').splitlines()
+        # Per-row mode parses text; chunked parts are assembled from the raw bytes
+        # (the CSV is UTF-8 and posted as UTF-8: no decode/re-encode per part)
+        if per_row:
+            fh = p.open('r', encoding='utf-8', errors='ignore', buffering=CSV_READ_BUFFER)
+        else:
+            fh = p.open('rb', buffering=CSV_READ_BUFFER)
     except Exception:
         return 0
+    with fh:
+        first_line = fh.readline()
+        if not first_line:
+            return 0
+        # Every event of the batch carries the same time: format it once
+        post = _batch_poster(env, format_ts(datetime.now(timezone.utc)))
+        # Rows are read as they are posted: memory stays at the posts in flight, not the whole file
+        if per_row:
+            rows = (line.rstrip('\n') for line in fh)
+            return _send_csv_row_events(post, rows, run_id, max_notes_len, rows_per_event)
+        header = first_line.rstrip(b'\r\n')
+        raw_rows = (line.rstrip(b'\r\n') for line in fh)
+        return _send_csv_parts(post, header, raw_rows, run_id, max_notes_len, lines_per_event_hint)
 
-    if not lines:
-        return 0
 
-    header = lines[0]
-    rows = lines[1:]
-
-    parts_posted = 0
-    now = datetime.now(timezone.utc)
-
-    if per_row:
-        # One event per row; notes = single CSV row; currQr = first column token; failureCode from pass_fail
-        for i, row in enumerate(rows, start=1):
-            # Split into max 10 fields to avoid breaking if comment contains commas
-            fields = row.split(',', 9)
-            # Extract first column (qr_or_mac)
-            curr_qr = fields[0].strip() if fields and fields[0].strip() else f"{run_id}-ROW-{i:05d}"
-            # Determine failure code from pass_fail column (index 6)
-            failure_code = 'ALL-PASS-000'
-            if len(fields) > 6:
-                pf_raw = fields[6].strip().lower()
-                if pf_raw in ('false', '0', 'no'):
-                    failure_code = 'ALL-FAIL-000'
-                else:
-                    failure_code = 'ALL-PASS-000'
-            # Notes only the CSV row
-            notes = row[:max_notes_len]
-            post_manuf_event(
-                curr_qr=curr_qr,
-                failure_code=failure_code,
-                start_time=now,
-                end_time=now,
-                notes=notes,
-                station_id=env['station_id'],
-                operator_id=env['operator_id'],
-                api_url=env['api_url']
-            )
-            parts_posted += 1
-        return parts_posted
-
-    # Default: chunked parts with header + many rows per event
-    idx = 0
+def _send_csv_row_events(post: Callable[[Dict], Optional[int]], rows: Iterable[str], run_id: str,
+                         max_notes_len: int, rows_per_event: int) -> int:
+    """Post one event per CSV row (or packed groups of rows); returns the number of events posted.
+    Events are built (and packed) as rows are read, so memory stays at the posts in flight.
+    """
+    events = _iter_row_events(rows, run_id, max_notes_len)
+    if rows_per_event > 1:
+        events = _pack_row_events(events, run_id, rows_per_event, max_notes_len)
+    # Rows are independent: post them concurrently over the pooled session
+    return _post_bounded(post, events)
+
+
+def _iter_row_events(rows: Iterable[str], run_id: str, max_notes_len: int) -> Iterator[Dict]:
+    # One event per row; notes = single CSV row; currQr = first column token; failureCode from pass_fail
+    for i, row in enumerate(rows, start=1):
+        # Only columns 0..6 are read: the comment (and anything after it) stays unsplit
+        fields = row.split(',', 7)
+        # Extract first column (qr_or_mac)
+        curr_qr = fields[0].strip() or f"{run_id}-ROW-{i:05d}"
+        # Determine failure code from pass_fail column (index 6)
+        failure_code = 'ALL-PASS-000'
+        if len(fields) > 6 and fields[6].strip().lower() in _FAIL_TOKENS:
+            failure_code = 'ALL-FAIL-000'
+        # Notes only the CSV row
+        notes = _truncate_utf8(row, max_notes_len)
+        yield {'curr_qr': curr_qr, 'failure_code': failure_code, 'notes': notes}
+
+
+def _post_bounded(post: Callable[[Dict], Optional[int]], events: Iterable[Dict]) -> int:
+    """Post events on DETAIL_POST_WORKERS threads; returns the number of events posted.
+    At most 2 * DETAIL_POST_WORKERS posts are pending: the next event is only taken from
+    events once the oldest post has finished, so a streamed source stays streamed.
+    """
+    posted = 0
+    in_flight: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=DETAIL_POST_WORKERS) as ex:
+        for event in events:
+            if len(in_flight) >= 2 * DETAIL_POST_WORKERS:
+                in_flight.popleft().result()
+            in_flight.append(ex.submit(post, event))
+            posted += 1
+    return posted
+
+
+def _send_csv_parts(post: Callable[[Dict], Optional[int]], header: bytes, rows: Iterable[bytes], run_id: str,
+                    max_notes_len: int, lines_per_event_hint: int) -> int:
+    """Post header + rows in parts of up to lines_per_event_hint rows and max_notes_len bytes."""
+    # Parts are built as rows are read and posted while reading continues
+    return _post_bounded(post, _iter_csv_parts(header, rows, run_id, max_notes_len, lines_per_event_hint))
+
+
+def _iter_csv_parts(header: bytes, rows: Iterable[bytes], run_id: str, max_notes_len: int,
+                    lines_per_event_hint: int) -> Iterator[Dict]:
     part = 1
-    while idx < len(rows):
-        chunk: List[str] = []
-        content_lines = [header]
-        while idx < len(rows):
-            tentative = content_lines + chunk + [rows[idx]]
-            notes = "\n".join(tentative)
-            if len(notes) > max_notes_len:
-                break
-            chunk.append(rows[idx])
-            idx += 1
-            if len(chunk) >= lines_per_event_hint:
-                break
-        notes = "\n".join(content_lines + chunk)
-        curr_qr = f"{run_id}-PART-{part:02d}"
-        post_manuf_event(
-            curr_qr=curr_qr,
-            failure_code='BATCH-DETAIL-000',
-            start_time=now,
-            end_time=now,
-            notes=notes,
-            station_id=env['station_id'],
-            operator_id=env['operator_id'],
-            api_url=env['api_url']
-        )
-        parts_posted += 1
-        part += 1
-
-    return parts_posted
+    chunk: List[bytes] = []
+    # len(b"\n".join([header] + chunk)), kept as a running count (joined once per part)
+    notes_len = len(header)
+    for row in rows:
+        add = len(row) + 1
+        if chunk and (len(chunk) >= lines_per_event_hint or notes_len + add > max_notes_len):
+            yield _csv_part_event(header, chunk, run_id, part, max_notes_len)
+            part += 1
+            chunk = []
+            notes_len = len(header)
+        chunk.append(row)
+        notes_len += add
+    if chunk:
+        yield _csv_part_event(header, chunk, run_id, part, max_notes_len)
+
+
+def _pack_row_events(events: Iterable[Dict], run_id: str, rows_per_event: int, max_notes_len: int) -> Iterator[Dict]:
+    """Pack per-row events into 'BATCH-ROWS-000' events of up to rows_per_event rows each.
+    Each packed event is yielded as soon as it is full. A row whose JSON item cannot fit
+    max_notes_len on its own keeps (and immediately yields) its single-row event.
+    """
+    batch_no = 0
+    items: List[str] = []
+    # len('[' + ','.join(items) + ']'), kept as a running count
+    notes_len = 1
+    for event in events:
+        item = _compact_json({'qr': event['curr_qr'], 'fc': event['failure_code'], 'row': event['notes']})
+        if len(item) + 2 > max_notes_len:
+            yield event
+            continue
+        if items and (len(items) >= rows_per_event or notes_len + len(item) + 1 > max_notes_len):
+            batch_no += 1
+            yield _rows_event(run_id, batch_no, items)
+            items = []
+            notes_len = 1
+        items.append(item)
+        notes_len += len(item) + 1
+    if items:
+        yield _rows_event(run_id, batch_no + 1, items)
+
+
+def _rows_event(run_id: str, batch_no: int, items: List[str]) -> Dict:
+    return {'curr_qr': f"{run_id}-ROWS-{batch_no:03d}", 'failure_code': 'BATCH-ROWS-000',
+            'notes': '[' + ','.join(items) + ']'}
+
+
+def _csv_part_event(header: bytes, chunk: List[bytes], run_id: str, part: int, max_notes_len: int) -> Dict:
+    # A single row longer than the limit goes out alone, truncated like per-row notes
+    notes = b"\n".join([header] + chunk)
+    if len(notes) > max_notes_len:
+        # Cut at a character boundary
+        notes = notes[:max_notes_len].decode('utf-8', 'ignore').encode('utf-8')
+    return {'curr_qr': f"{run_id}-PART-{part:02d}", 'failure_code': 'BATCH-DETAIL-000', 'notes': notes}